@@ -0,0 +1,210 @@
+"""
+Micro-benchmarks for the storage backends, helpers and horse race.
+
+Usage: python bench/bench.py [--quick] [--json bench_output.json] [--filter NAME]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import helper
+import race_sim
+from cogs.gamble import get_race_string, simulate_race
+from const import EMOJI_OCTOPUS, EMOJI_PENGUIN, EMOJI_ROCKET, EMOJI_SANTA
+from managers import TokenManager
+from storage import (
+    JournalTokenStorage,
+    JsonTokenStorage,
+    SqliteDatabase,
+    SqliteTokenStorage,
+)
+
+PUZZLE_URL = (
+    "https://www.washingtonpost.com/crossword-puzzles/daily/?"
+    "id=tca231219&set=wapo-daily&puzzleType=crossword&"
+    "playId=6d503407-bd5f-4857-a127-3b521c01e58e"
+)
+SYMBOLS = [EMOJI_ROCKET, EMOJI_PENGUIN, EMOJI_OCTOPUS, EMOJI_SANTA]
+
+
+def measure(func, min_time: float) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    repeats = max(1, int(min_time / 0.2))
+    best = min(timer.repeat(repeat=repeats, number=number)) / number
+
+    return {"seconds_per_op": best, "ops_per_second": 1 / best}
+
+
+def populate(backend: str, directory: str, nr_players: int) -> str:
+    """
+    Writes a token ledger with `nr_players` players and returns its path.
+    """
+    balances = {str(player_id): 100 for player_id in range(nr_players)}
+
+    if backend == "json":
+        path = os.path.join(directory, "tokens.json")
+        with open(path, "w") as file:
+            json.dump(balances, file)
+
+    elif backend == "sqlite":
+        path = os.path.join(directory, "tokens.db")
+        database = SqliteDatabase(path)
+        SqliteTokenStorage(database)
+        with database.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO tokens (player_id, tokens) VALUES (?, ?)",
+                balances.items(),
+            )
+        database.close()
+
+    elif backend == "journal":
+        path = os.path.join(directory, "tokens.jsonl")
+        storage = JournalTokenStorage(path)
+        with open(storage.snapshot_path, "w") as file:
+            json.dump({"seq": 0, "tokens": balances}, file)
+        storage.close()
+
+    else:
+        raise ValueError(f"Unknown backend {backend}")
+
+    return path
+
+
+def open_manager(path: str) -> TokenManager:
+    if path.endswith(".json"):
+        # Keep background flushes out of the measurements
+        return TokenManager(JsonTokenStorage(path, flush_delay=3600))
+
+    if path.endswith(".jsonl"):
+        return TokenManager(JournalTokenStorage(path, compact_bytes=1 << 40))
+
+    return TokenManager(path)
+
+
+def bench_managers(player_counts):
+    for backend in ("json", "sqlite", "journal"):
+        for nr_players in player_counts:
+            with tempfile.TemporaryDirectory() as directory:
+                path = populate(backend, directory, nr_players)
+                params = {"backend": backend, "players": nr_players}
+
+                def load():
+                    open_manager(path).close()
+
+                yield "token_manager.load", params, load
+
+                token_manager = open_manager(path)
+                player = nr_players // 2
+
+                yield "token_manager.get_tokens", params, lambda: (
+                    token_manager.get_tokens(player)
+                )
+                yield "token_manager.update_tokens", params, lambda: (
+                    token_manager.update_tokens(player, 1)
+                )
+                yield "token_manager.transfer", params, lambda: (
+                    token_manager.transfer(player, 0, 1)
+                )
+                yield "token_manager.reward_all", params, lambda: (
+                    token_manager.reward_all(1)
+                )
+                yield "token_manager.get_rank", params, lambda: (
+                    token_manager.get_rank(player)
+                )
+                yield "token_manager.get_page", params, lambda: (
+                    token_manager.get_page(nr_players // 20)
+                )
+
+                if backend == "json":
+                    store = token_manager.storage._store
+
+                    def flush():
+                        store.mark_dirty()
+                        store.flush()
+
+                    yield "token_manager.flush", params, flush
+
+                token_manager.close()
+
+
+def bench_helpers():
+    date_str = helper.get_puzzle_date(PUZZLE_URL)
+
+    yield "helper.get_puzzle_date", {}, lambda: helper.get_puzzle_date(PUZZLE_URL)
+    yield "helper.get_puzzle_weekday", {}, lambda: helper.get_puzzle_weekday(
+        date_str
+    )
+    yield "helper.get_puzzle_reward", {}, lambda: helper.get_puzzle_reward(
+        "Sunday", 301
+    )
+
+
+def bench_race():
+    length = 20
+
+    def run_race():
+        for _ in simulate_race([0, 0, 0, 0], length):
+            pass
+
+    def render_race():
+        for values, standings in simulate_race([0, 0, 0, 0], length):
+            get_race_string(values, standings, SYMBOLS, length)
+
+    yield "gamble.simulate_race", {"length": length}, run_race
+    yield "gamble.get_race_string", {"length": length}, lambda: get_race_string(
+        [5, 20, 12, 20], [1, 3], SYMBOLS, length
+    )
+    yield "gamble.render_race_frames", {"length": length}, render_race
+    yield "race_sim.simulate_standings", {"races": 100_000}, lambda: (
+        race_sim.simulate_standings(100_000)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="skip 100k players")
+    parser.add_argument("--json", help="write machine-readable results to a file")
+    parser.add_argument("--filter", default="", help="only run matching benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.6)
+    args = parser.parse_args()
+
+    player_counts = [10, 1_000] if args.quick else [10, 1_000, 100_000]
+    suites = [bench_managers(player_counts), bench_helpers(), bench_race()]
+
+    results = []
+
+    for suite in suites:
+        for name, params, func in suite:
+            if args.filter not in name:
+                continue
+
+            timing = measure(func, args.min_time)
+            result = {"name": name, "params": params, **timing}
+            results.append(result)
+
+            params_str = " ".join(f"{key}={value}" for key, value in params.items())
+            print(
+                f"{name:<32} {params_str:<28} "
+                f"{timing['seconds_per_op'] * 1e6:12.2f} us/op"
+            )
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
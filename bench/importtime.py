@@ -0,0 +1,103 @@
+"""
+Reports where the bot's import time goes, using `python -X importtime`.
+
+Usage: python bench/importtime.py [--module bot] [--top 15] [--json importtime.json]
+
+Imports run in a fresh interpreter with src/ as the working directory, so
+nothing is cached from this process. Times are cumulative: a module's time
+includes everything it imports for the first time.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+LINE_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_imports(module: str) -> list:
+    """
+    Imports `module` in a new interpreter and parses the importtime report.
+
+    Returns:
+    - list: One dict per imported module with its self and cumulative
+      microseconds and its nesting depth.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True,
+    ).stderr
+
+    imports = []
+
+    for line in output.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(
+                {
+                    "module": name,
+                    "self_us": int(self_us),
+                    "cumulative_us": int(cumulative_us),
+                    "depth": len(indent) // 2,
+                }
+            )
+
+    return imports
+
+
+def get_packages(imports: list) -> dict:
+    """
+    Sums the self time of the imported modules by top-level package.
+    """
+    packages = {}
+
+    for entry in imports:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="bot")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="write machine-readable results to a file")
+    args = parser.parse_args()
+
+    imports = profile_imports(args.module)
+    packages = get_packages(imports)
+    total_us = sum(packages.values())
+
+    print(f"import {args.module}: {total_us / 1000:.1f} ms\n")
+    print("By package (self time):")
+    by_time = sorted(packages.items(), key=lambda item: -item[1])
+    for package, self_us in by_time[: args.top]:
+        print(f"  {package:<28} {self_us / 1000:8.1f} ms {self_us / total_us:6.1%}")
+
+    # The report lists a module after its own imports, one level deeper
+    print(f"\nImported by {args.module} (cumulative time):")
+    direct = [entry for entry in imports if entry["depth"] == 1]
+    for entry in sorted(direct, key=lambda entry: -entry["cumulative_us"])[: args.top]:
+        print(f"  {entry['module']:<28} {entry['cumulative_us'] / 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {"module": args.module, "total_us": total_us, "imports": imports},
+                file,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
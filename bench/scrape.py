@@ -0,0 +1,117 @@
+"""
+Compares the per-scrape time of the lean and full browser profiles on the live site.
+
+Usage: python bench/scrape.py [--runs 5] [--profiles lean full] [--json out.json]
+
+Every profile runs in its own process, since the profile is read from
+WAPO_BROWSER_PROFILE when wapo_api is imported. The first scrape of each profile
+includes starting the browser and is reported separately.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+STEPS = [
+    "driver_start",
+    "consent_preset",
+    "page_load",
+    "wait_cookie_button",
+    "cookie_click",
+    "iframe_switch",
+    "wait_puzzle_link",
+    "wait_footer",
+    "wait_invite_button",
+    "wait_invite_link",
+    "wait_modal_title",
+    "wait_clock",
+]
+
+
+def run_profile(nr_runs: int) -> dict:
+    import wapo_api
+    from metrics import SCRAPE_STEP_SECONDS
+
+    scrapes = []
+
+    try:
+        for _ in range(nr_runs):
+            start = time.perf_counter()
+            url = wapo_api.get_wapo_url()
+            url_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            wapo_api.inspect_puzzle(url)
+            inspect_seconds = time.perf_counter() - start
+
+            scrapes.append({"get_wapo_url": url_seconds, "inspect": inspect_seconds})
+    finally:
+        wapo_api.close_pool()
+
+    steps = {
+        step: {
+            "count": SCRAPE_STEP_SECONDS.get_count(step=step),
+            "seconds": SCRAPE_STEP_SECONDS.get_sum(step=step),
+        }
+        for step in STEPS
+        if SCRAPE_STEP_SECONDS.get_count(step=step)
+    }
+
+    return {"profile": wapo_api.BROWSER_PROFILE, "scrapes": scrapes, "steps": steps}
+
+
+def summarize(result: dict):
+    cold, *warm = result["scrapes"]
+    print(f"{result['profile']}:")
+    print(f"  cold get_wapo_url {cold['get_wapo_url']:8.2f} s")
+
+    for name in ("get_wapo_url", "inspect"):
+        if warm:
+            mean = sum(scrape[name] for scrape in warm) / len(warm)
+            print(f"  warm {name:<12} {mean:8.2f} s")
+
+    for step, timing in result["steps"].items():
+        print(
+            f"    {step:<20} {timing['seconds'] / timing['count']:8.3f} s"
+            f" x{timing['count']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profiles", nargs="+", default=["lean", "full"])
+    parser.add_argument("--json", help="write machine-readable results to a file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.runs)))
+        return
+
+    results = []
+
+    for profile in args.profiles:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--runs", str(args.runs)],
+            env={**os.environ, "WAPO_BROWSER_PROFILE": profile},
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        results.append(result)
+        summarize(result)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"runs": args.runs, "results": results}, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,90 @@
 import os
+import time
 import asyncio
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
-from managers import TokenManager, CrosswordManager
-from cogs.crossword import CrosswordCog
-from cogs.gamble import GambleCog
-from cogs.token import TokenCog
-
-
-class WaPoBot(commands.Bot):
-    def __init__(self, command_prefix, intents):
-        super().__init__(command_prefix=command_prefix, intents=intents)
-        self.token_manager = TokenManager("data/tokens.json")
-        self.crossword_manager = CrosswordManager("data/crosswords.json")
+import wapo_api
+import metrics
+import watchdog
+from guilds import GuildStates
+
+EXTENSIONS = [
+    "cogs.crossword",
+    "cogs.gamble",
+    "cogs.token",
+    "cogs.config",
+    "cogs.admin",
+]
+
+
+class WaPoBot(commands.AutoShardedBot):
+    def __init__(self, command_prefix, intents, **options):
+        super().__init__(command_prefix=command_prefix, intents=intents, **options)
+
+        self.guild_states = GuildStates(
+            tokens_path=os.getenv("WAPO_TOKENS", "data/tokens.json"),
+            database_path=os.getenv("WAPO_DATABASE"),
+        )
+
+        self.metrics_runner = None
+        self.before_invoke(self.start_command_timer)
+        self.after_invoke(self.stop_command_timer)
+
+    async def setup_hook(self):
+        self.compact_tokens.start()
+
+        # Browsers left behind by a previous run that crashed or was killed
+        await self.reap_browsers()
+        self.watch_resources.start()
+
+        scraper_workers = int(os.getenv("WAPO_SCRAPER_WORKERS", "0"))
+        if scraper_workers > 0:
+            wapo_api.start_scraper_workers(
+                scraper_workers, int(os.getenv("WAPO_SCRAPER_QUEUE", "8"))
+            )
+
+        metrics_port = os.getenv("WAPO_METRICS_PORT")
+        if metrics_port:
+            self.metrics_runner = await metrics.start_http_server(int(metrics_port))
+
+    async def start_command_timer(self, ctx: commands.Context):
+        ctx.command_started = time.perf_counter()
+
+    async def stop_command_timer(self, ctx: commands.Context):
+        metrics.COMMAND_SECONDS.observe(
+            time.perf_counter() - ctx.command_started,
+            command=ctx.command.qualified_name,
+        )
+
+    @tasks.loop(hours=1)
+    async def compact_tokens(self):
+        for state in self.guild_states.opened():
+            await asyncio.to_thread(state.compact)
+
+    async def reap_browsers(self):
+        killed = await asyncio.to_thread(
+            watchdog.reap_orphans, wapo_api.BROWSER_PIDFILE
+        )
+
+        if killed:
+            print(f"Killed {killed} orphaned browser process(es)")
+            metrics.WATCHDOG_KILLS.inc(killed, reason="orphan")
+
+    @tasks.loop(seconds=30)
+    async def watch_resources(self):
+        await asyncio.to_thread(wapo_api.enforce_scrape_limits)
+        await self.reap_browsers()
+
+    async def close(self):
+        self.compact_tokens.cancel()
+        self.watch_resources.cancel()
+        await super().close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        self.guild_states.close()
+        await wapo_api.aclose()
 
     async def on_ready(self):
         print(f"{self.user} has connected!")
@@ -24,6 +94,9 @@ class WaPoBot(commands.Bot):
 
         print(error)
 
+        command = ctx.command.qualified_name if ctx.command else "unknown"
+        metrics.COMMAND_ERRORS.inc(command=command, error=type(error).__name__)
+
         if isinstance(error, commands.CommandNotFound):
             await ctx.send(content=error)
 
@@ -59,12 +132,23 @@ async def main():
     intents.message_content = True
     intents.reactions = True
 
-    bot = WaPoBot(command_prefix="!", intents=intents)
+    # Several processes can split the shards between them, each one then only
+    # opens the state of the guilds on its own shards
+    sharding = {}
+    if os.getenv("WAPO_SHARD_COUNT"):
+        sharding["shard_count"] = int(os.getenv("WAPO_SHARD_COUNT"))
+    if os.getenv("WAPO_SHARD_IDS"):
+        sharding["shard_ids"] = [
+            int(shard_id) for shard_id in os.getenv("WAPO_SHARD_IDS").split(",")
+        ]
+
+    bot = WaPoBot(command_prefix="!", intents=intents, **sharding)
     bot.help_command = WaPoHelp()
-    await bot.add_cog(CrosswordCog(bot))
-    await bot.add_cog(GambleCog(bot))
-    await bot.add_cog(TokenCog(bot))
-    await bot.start(os.getenv("DISCORD_TOKEN"))
+
+    async with bot:
+        for extension in EXTENSIONS:
+            await bot.load_extension(extension)
+        await bot.start(os.getenv("DISCORD_TOKEN"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tracemalloc
+from discord.ext import commands
+
+import watchdog
+
+# Frames kept per allocation, more frames make tracing slower
+TRACE_FRAMES = 1
+
+MESSAGE_LIMIT = 1900
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 2**20:.1f} MiB"
+
+
+def _heap_report(nr_lines: int) -> str:
+    current, peak = tracemalloc.get_traced_memory()
+    processes = watchdog.list_processes()
+    children = watchdog.get_descendants(os.getpid(), processes)
+
+    lines = [
+        f"Traced heap: {_format_bytes(current)} (peak {_format_bytes(peak)})",
+        f"Bot process: {_format_bytes(watchdog.get_rss_bytes([os.getpid()]))}",
+        f"Child processes: {_format_bytes(watchdog.get_rss_bytes(children))}"
+        f" in {len(children)} process(es)",
+        "",
+    ]
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+    for stat in snapshot.statistics("lineno")[:nr_lines]:
+        frame = stat.traceback[0]
+        lines.append(
+            f"{_format_bytes(stat.size):>10} {stat.count:>8} "
+            f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        )
+
+    return "\n".join(lines)[:MESSAGE_LIMIT]
+
+
+class AdminCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        if os.getenv("WAPO_TRACEMALLOC") and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        if not await self.bot.is_owner(ctx.author):
+            raise commands.NotOwner("Only the owner of the bot can do this")
+        return True
+
+    @commands.command()
+    async def heap(self, ctx: commands.Context, nr_lines: int = 10):
+        # Tracing slows every allocation down, so it only runs once asked for
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            await ctx.send(
+                content="Started tracing allocations, run `!heap` again later to "
+                "see where the memory goes"
+            )
+            return
+
+        report = await asyncio.to_thread(_heap_report, max(0, nr_lines))
+        await ctx.send(content=f"```\n{report}\n```")
+
+    @commands.command()
+    async def heapstop(self, ctx: commands.Context):
+        tracemalloc.stop()
+        await ctx.send(content="Stopped tracing allocations")
+
+    async def cog_command_error(self, ctx: commands.Context, error):
+        if isinstance(error, commands.CommandError):
+            await ctx.send(content=f"`!{ctx.command.name}` error: {error}")
+
+
+async def setup(bot):
+    await bot.add_cog(AdminCog(bot))
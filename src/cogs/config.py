@@ -0,0 +1,71 @@
+import calendar
+import discord
+from discord.ext import commands
+
+
+class ConfigCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+
+        if not ctx.author.guild_permissions.manage_guild:
+            raise commands.MissingPermissions(["manage_guild"])
+
+        return True
+
+    @commands.command()
+    async def setchannel(
+        self, ctx: commands.Context, channel: discord.TextChannel = None
+    ):
+        channel = channel or ctx.channel
+        self.bot.guild_states.get(ctx.guild).config.set_channel_id(channel.id)
+        await ctx.send(content=f"Crosswords will be posted in {channel.mention}")
+
+    @commands.command()
+    async def setcooldown(self, ctx: commands.Context, command: str, seconds: float):
+        target = self.bot.get_command(command)
+
+        if target is None:
+            raise commands.BadArgument(f"Unknown command {command}")
+
+        if seconds < 0:
+            raise commands.BadArgument("Cooldown cannot be negative")
+
+        # Players already on cooldown keep their current one until it expires
+        config = self.bot.guild_states.get(ctx.guild).config
+        config.set_cooldown(target.qualified_name, seconds)
+        await ctx.send(content=f"`!{command}` cooldown set to {seconds:g} seconds")
+
+    @commands.command()
+    async def setreward(self, ctx: commands.Context, weekday: str, nr_tokens: int):
+        weekday = weekday.capitalize()
+
+        if weekday not in calendar.day_name:
+            raise commands.BadArgument(f"Unknown weekday {weekday}")
+
+        if nr_tokens < 0:
+            raise commands.BadArgument("Reward cannot be negative")
+
+        config = self.bot.guild_states.get(ctx.guild).config
+        config.set_day_reward(weekday, nr_tokens)
+        await ctx.send(content=f"{weekday} crosswords reward {nr_tokens} token(s)")
+
+    @commands.command()
+    async def setwatch(self, ctx: commands.Context, enabled: bool):
+        self.bot.guild_states.get(ctx.guild).config.set_watch(enabled)
+
+        if enabled:
+            await ctx.send(content="Posted crosswords will be checked automatically")
+        else:
+            await ctx.send(content="Crosswords will only be checked on reactions")
+
+    async def cog_command_error(self, ctx: commands.Context, error):
+        if isinstance(error, commands.CommandError):
+            await ctx.send(content=f"`!{ctx.command.name}` error: {error}")
+
+
+async def setup(bot):
+    await bot.add_cog(ConfigCog(bot))
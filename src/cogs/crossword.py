@@ -1,20 +1,190 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 import wapo_api
 import helper
 from helper import get_embed
-from const import CHANNEL_ID
+from completion_watcher import CompletionWatcher
+from const import (
+    ARCHIVE_DAYS,
+    ARCHIVE_MISS_SECONDS,
+    UNPUBLISHED_RETRY_SECONDS,
+    WATCH_BACKOFF,
+    WATCH_INITIAL_SECONDS,
+    WATCH_MAX_SECONDS,
+)
+from guilds import GuildState, guild_cooldown
+from singleflight import SingleFlight
+
+CHECK_EMOJIS = {"👍", "✅"}
 
 
 class CrosswordCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._fetch_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Archive walks take up to a scrape timeout per day, so they never hold
+        # the lock that today's fetch waits on
+        self._archive_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # When each (guild id, date) missing from the archive may be fetched again
+        self._archive_misses: Dict[Tuple[int, str], float] = {}
+        # Per guild, until when to serve the latest puzzle while today's is not
+        # published yet, and its URL
+        self._unpublished: Dict[int, Tuple[float, str]] = {}
+        self._checks = SingleFlight()
+        self.watcher = CompletionWatcher(
+            self.poll_puzzle, WATCH_INITIAL_SECONDS, WATCH_MAX_SECONDS, WATCH_BACKOFF
+        )
+
+    async def cog_load(self):
+        self.prefetch_puzzle.start()
+        self.watcher.start()
+
+    async def cog_unload(self):
+        self.prefetch_puzzle.cancel()
+        await self.watcher.stop()
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
+
+    @tasks.loop(minutes=15)
+    async def prefetch_puzzle(self):
+        """
+        Keeps today's puzzle URL cached in every guild with a crossword channel so
+        !wapo can answer without a scrape
+        """
+        puzzle_date = helper.get_current_puzzle_date()
+        guilds = []
+
+        for guild in self.bot.guilds:
+            state = self.bot.guild_states.peek(guild)
+
+            # A guild without state has no crossword channel either
+            if state is None or state.config.get_channel_id() is None:
+                continue
+
+            if not state.puzzle_manager.has_puzzle(puzzle_date):
+                guilds.append(guild)
+            elif state.config.get_watch():
+                # Picks up today's puzzle again after a restart
+                self.watch_puzzle(guild, puzzle_date)
+
+        if not guilds:
+            return
+
+        try:
+            # get_puzzle_url caches by date and waits out an unpublished puzzle
+            for guild in guilds:
+                await self.get_puzzle_url(guild)
+
+        except Exception as error:
+            print(f"Unable to prefetch puzzle URL: {error}")
+
+    @prefetch_puzzle.before_loop
+    async def before_prefetch_puzzle(self):
+        await self.bot.wait_until_ready()
+
+    async def get_puzzle_url(
+        self, guild: discord.Guild, puzzle_date: str = None
+    ) -> str:
+        """
+        Returns the URL of a puzzle for a guild, generating and caching it if
+        needed. Every guild plays its own copy of the puzzle.
+
+        Parameters:
+        - guild (discord.Guild): The guild that will play the puzzle.
+        - puzzle_date (str, optional): The date of the puzzle, today's by default.
+          Earlier puzzles are fetched together with the rest of the archive.
+
+        Raises:
+        - ValueError: If the archive has no puzzle for `puzzle_date`.
+        """
+        puzzle_manager = self.bot.guild_states.get(guild).puzzle_manager
+        today = helper.get_current_puzzle_date()
+        puzzle_date = puzzle_date or today
+        url = puzzle_manager.get_puzzle_url(puzzle_date)
+
+        if url is not None:
+            return url
+
+        if puzzle_date == today:
+            async with self._fetch_locks[guild.id]:
+                url = puzzle_manager.get_puzzle_url(puzzle_date)
+                expires, latest_url = self._unpublished.get(guild.id, (0, None))
+
+                if url is None and expires > time.monotonic():
+                    url = latest_url
+
+                elif url is None:
+                    url = await wapo_api.aget_wapo_url()
+                    url_date = helper.get_puzzle_date(url)
+
+                    # An archive walk may have cached the puzzle in the meantime
+                    if puzzle_manager.has_puzzle(url_date):
+                        url = puzzle_manager.get_puzzle_url(url_date)
+                    else:
+                        puzzle_manager.save_puzzle_url(url_date, url)
+
+                    # Around the rollover the latest puzzle is still yesterday's,
+                    # which is cached under its own date and so missed by `today`
+                    if url_date != puzzle_date:
+                        self._unpublished[guild.id] = (
+                            time.monotonic() + UNPUBLISHED_RETRY_SECONDS,
+                            url,
+                        )
+
+            return url
+
+        key = (guild.id, puzzle_date)
+
+        async with self._archive_locks[guild.id]:
+            url = puzzle_manager.get_puzzle_url(puzzle_date)
+
+            if url is None and self._archive_misses.get(key, 0) <= time.monotonic():
+                # One archive walk fills the cache for every recent day
+                urls = await wapo_api.aget_wapo_urls(ARCHIVE_DAYS)
+
+                for archive_date, archive_url in urls.items():
+                    if not puzzle_manager.has_puzzle(archive_date):
+                        puzzle_manager.save_puzzle_url(archive_date, archive_url)
+
+                url = puzzle_manager.get_puzzle_url(puzzle_date)
+
+                if url is None:
+                    now = time.monotonic()
+                    self._archive_misses = {
+                        miss: expires
+                        for miss, expires in self._archive_misses.items()
+                        if expires > now
+                    }
+                    self._archive_misses[key] = now + ARCHIVE_MISS_SECONDS
+
+        if url is None:
+            raise ValueError(f"No puzzle for {puzzle_date} in the archive")
+
+        return url
 
     @commands.command()
-    @commands.cooldown(1, 60, commands.BucketType.default)
-    async def wapo(self, ctx: commands.Context):
-        if CHANNEL_ID == ctx.channel.id:
+    @commands.dynamic_cooldown(guild_cooldown(10), commands.BucketType.member)
+    async def wapo(self, ctx: commands.Context, *, day: str = None):
+        state = self.bot.guild_states.get(ctx.guild)
+
+        if state.config.get_channel_id() == ctx.channel.id:
+            today = helper.get_current_puzzle_date()
+
+            try:
+                puzzle_date = helper.resolve_puzzle_date(
+                    day or "today", max_days=ARCHIVE_DAYS
+                )
+            except ValueError as error:
+                raise commands.BadArgument(str(error)) from error
+
             embed_loading = get_embed(
                 "Washington Post Daily Crossword",
                 "Fetching URL...",
@@ -23,7 +193,7 @@ class CrosswordCog(commands.Cog):
             ctx.sent_message = await ctx.send(embed=embed_loading)
 
             try:
-                url = wapo_api.get_wapo_url()
+                url = await self.get_puzzle_url(ctx.guild, puzzle_date)
                 date_str = helper.get_puzzle_date(url)
                 weekday_str = helper.get_puzzle_weekday(date_str)
 
@@ -35,6 +205,13 @@ class CrosswordCog(commands.Cog):
                 )
                 await ctx.sent_message.edit(embed=embed_success)
 
+                state.message_manager.save_puzzle_message(
+                    ctx.sent_message.id, url, date_str
+                )
+
+                if state.config.get_watch() and date_str == today:
+                    self.watch_puzzle(ctx.guild, date_str)
+
             except Exception as error:
                 raise commands.CommandError("An error occurred.") from error
 
@@ -51,19 +228,32 @@ class CrosswordCog(commands.Cog):
             await ctx.send(f"An error occurred: {error}")
 
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
-        if user == self.bot.user or reaction.message.channel.id != CHANNEL_ID:
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        guild = self.bot.get_guild(payload.guild_id) if payload.guild_id else None
+
+        if guild is None:
+            return
+
+        # Raw events fire for every reaction the bot can see, so reject anything
+        # that is not on one of our puzzle messages before doing any other work.
+        # Guilds that never used the bot have no puzzle messages.
+        state = self.bot.guild_states.peek(guild)
+
+        if state is None or not state.message_manager.is_puzzle_message(
+            payload.message_id
+        ):
             return
 
-        if reaction.emoji not in ("👍", "✅"):
+        if payload.user_id == self.bot.user.id:
             return
 
-        if len(reaction.message.embeds) == 0:
+        if str(payload.emoji) not in CHECK_EMOJIS:
             return
 
-        puzzle_link = reaction.message.embeds[0].url
+        puzzle = state.message_manager.get_puzzle_message(payload.message_id)
+        channel = self.bot.get_channel(payload.channel_id)
 
-        if not helper.is_message_url(puzzle_link):
+        if puzzle is None or channel is None:
             return
 
         embed_loading = get_embed(
@@ -71,46 +261,112 @@ class CrosswordCog(commands.Cog):
             "Checking if crossword is complete...",
             discord.Color.teal(),
         )
-        message = await reaction.message.channel.send(embed=embed_loading)
+        message = await channel.send(embed=embed_loading)
+
+        # Reactions arriving while the puzzle is being checked share that check
+        embed_result = await self._checks.do(
+            (guild.id, puzzle["date"]), lambda: self.check_puzzle(state, puzzle["url"])
+        )
+        await message.edit(embed=embed_result)
+
+    def watch_puzzle(self, guild: discord.Guild, puzzle_date: str):
+        state = self.bot.guild_states.get(guild)
+
+        if not state.crossword_manager.has_crossword(puzzle_date):
+            self.watcher.watch((guild.id, puzzle_date))
+
+    async def poll_puzzle(self, key) -> bool:
+        """
+        Checks a watched puzzle through the same path as reactions and announces
+        the reward when it is complete.
+
+        Returns:
+        - bool: True once the puzzle no longer needs watching: it is complete,
+          a new puzzle was published or the guild is gone.
+        """
+        guild_id, puzzle_date = key
+        guild = self.bot.get_guild(guild_id)
+
+        if guild is None or puzzle_date != helper.get_current_puzzle_date():
+            return True
+
+        state = self.bot.guild_states.get(guild)
+        url = state.puzzle_manager.get_puzzle_url(puzzle_date)
+
+        if url is None or state.crossword_manager.has_crossword(puzzle_date):
+            return True
+
+        embed_result, led = await self._checks.do_with_leader(
+            key, lambda: self.check_puzzle(state, url)
+        )
+
+        if not state.crossword_manager.has_crossword(puzzle_date):
+            return False
+
+        # A reaction that started the check already posted its result
+        if not led:
+            return True
+
+        channel = self.bot.get_channel(state.config.get_channel_id())
+        if channel is not None:
+            await channel.send(embed=embed_result)
+
+        return True
+
+    async def check_puzzle(self, state: GuildState, puzzle_link: str) -> discord.Embed:
+        """
+        Checks if a puzzle is complete and rewards all players if it is.
+
+        Parameters:
+        - state (GuildState): The guild that played the puzzle.
+        - puzzle_link (str): The URL of the crossword puzzle.
 
+        Returns:
+        - discord.Embed: The message describing the outcome.
+        """
         puzzle_date = helper.get_puzzle_date(puzzle_link)
 
-        if self.bot.crossword_manager.has_crossword(puzzle_date):
-            embed_warning = get_embed(
+        if state.crossword_manager.has_crossword(puzzle_date):
+            return get_embed(
                 "Crossword Checker",
                 "Crossword is already solved",
                 discord.Color.orange(),
             )
-            await message.edit(embed=embed_warning)
-            return
 
-        if not wapo_api.is_complete(puzzle_link):
-            embed_error = get_embed(
+        try:
+            inspection = await wapo_api.ainspect_puzzle(puzzle_link)
+        except Exception as error:
+            print(f"Unable to check puzzle complete: {error}")
+            inspection = None
+
+        if inspection is None or not inspection.complete:
+            return get_embed(
                 "Crossword Checker",
                 "Crossword is not complete",
                 discord.Color.red()
             )
-            await message.edit(embed=embed_error)
-            return
 
-        self.bot.crossword_manager.save_crossword(puzzle_date)
+        state.crossword_manager.save_crossword(puzzle_date)
 
         puzzle_weekday = helper.get_puzzle_weekday(puzzle_date)
-        puzzle_time = wapo_api.get_puzzle_time(puzzle_link)
-        puzzle_reward = helper.get_puzzle_reward(puzzle_weekday, puzzle_time)
-
-        players = self.bot.token_manager.get_players()
+        puzzle_reward = helper.get_puzzle_reward(
+            puzzle_weekday, inspection.solve_seconds, state.config.get_day_rewards()
+        )
 
-        for player in players:
-            self.bot.token_manager.update_tokens(player, puzzle_reward)
+        async with state.player_locks.hold_all():
+            nr_players = await asyncio.to_thread(
+                state.token_manager.reward_all, puzzle_reward, "crossword"
+            )
 
-        embed_success = get_embed(
+        return get_embed(
             "Crossword Checker",
             (
                 f"Crossword complete! {puzzle_reward} token(s)"
-                f" rewarded to {len(players)} players"
+                f" rewarded to {nr_players} players"
             ),
             discord.Color.green(),
         )
 
-        await message.edit(embed=embed_success)
+
+async def setup(bot):
+    await bot.add_cog(CrosswordCog(bot))
@@ -1,25 +1,70 @@
 import math
-import random
 import asyncio
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
 import discord
 from discord.ext import commands
 
+from guilds import GuildState, guild_cooldown
 from helper import get_embed
+from managers import InsufficientTokensError
+from race_renderer import RaceRenderer
 from const import (
+    GAMBLE_WINNINGS_TABLE,
+    RACE_LOBBY_SECONDS,
     EMOJI_ROCKET,
     EMOJI_PENGUIN,
     EMOJI_OCTOPUS,
     EMOJI_SANTA,
+    EMOJI_HORSE_RACING,
 )
 
 
+@dataclass
+class Bet:
+    """
+    A bet on a row of the next race
+    """
+
+    player_id: int
+    player_name: str
+    row: int
+    amount: int
+
+
+@dataclass
+class RaceLobby:
+    """
+    The bets placed in a channel before its next race starts
+    """
+
+    state: GuildState
+    bets: List[Bet] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+
 class GambleCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.renderer = RaceRenderer()
+        self.lobbies: Dict[int, RaceLobby] = {}
+        # Every lobby until its bets are settled, including ones racing
+        self.lobby_tasks: Set[asyncio.Task] = set()
+
+    async def cog_unload(self):
+        # Cancelled lobbies refund their bets
+        tasks = list(self.lobby_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
 
     @commands.command()
-    @commands.cooldown(1, 30, commands.BucketType.user)
+    @commands.dynamic_cooldown(guild_cooldown(30), commands.BucketType.member)
     async def gamble(self, ctx: commands.Context, row: int, amount: int):
         if not 1 <= row <= 4:
             raise commands.BadArgument("You must gamble on rows 1-4")
@@ -29,24 +74,139 @@ class GambleCog(commands.Cog):
 
         author_id = ctx.author.id
         author_name = ctx.author.name
-        author_tokens = self.bot.token_manager.get_tokens(author_id)
+        state = self.bot.guild_states.get(ctx.guild)
+        token_manager = state.token_manager
+
+        async with state.player_locks.hold(author_id):
+            if token_manager.get_tokens(author_id) < amount:
+                raise commands.CommandError("Insufficient tokens")
+
+            lobby = self.lobbies.get(ctx.channel.id)
+            opened = lobby is None
+
+            if opened:
+                lobby = RaceLobby(state)
+                self.lobbies[ctx.channel.id] = lobby
+                lobby.task = asyncio.create_task(self.run_lobby(ctx.channel, lobby))
+                self.lobby_tasks.add(lobby.task)
+                lobby.task.add_done_callback(self.lobby_done)
+
+            # Registered before the debit, so a lobby cancelled meanwhile refunds
+            # it. The refund waits for this player's lock, so it follows the debit.
+            bet = Bet(author_id, author_name, row - 1, amount)
+            lobby.bets.append(bet)
+
+            try:
+                # Shielded, a debit that started also completes on cancellation
+                await asyncio.shield(
+                    asyncio.to_thread(
+                        token_manager.update_tokens, author_id, -amount, "gamble bet"
+                    )
+                )
+            except InsufficientTokensError as error:
+                lobby.bets.remove(bet)
+
+                if not lobby.bets:
+                    lobby.task.cancel()
+                    if self.lobbies.get(ctx.channel.id) is lobby:
+                        del self.lobbies[ctx.channel.id]
+
+                raise commands.CommandError("Insufficient tokens") from error
+
+        if opened:
+            await ctx.send(
+                content=(
+                    f"A horse race starts in {RACE_LOBBY_SECONDS} seconds! "
+                    "Place your bets with `!gamble <row> <amount>`"
+                )
+            )
+
+        await ctx.message.add_reaction(EMOJI_HORSE_RACING)
+
+    def lobby_done(self, task: asyncio.Task):
+        self.lobby_tasks.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Horse race lobby failed: {task.exception()}")
+
+    async def run_lobby(self, channel: discord.abc.Messageable, lobby: RaceLobby):
+        """
+        Waits for bets, runs a single race for all of them and pays out the
+        winnings in one update. Bets are refunded if the race fails or the lobby
+        is cancelled before the payout, e.g. when the bot shuts down.
+        """
+        settled = False
+
+        try:
+            await asyncio.sleep(RACE_LOBBY_SECONDS)
+            self.lobbies.pop(channel.id, None)
 
-        if author_tokens < amount:
-            raise commands.CommandError("Insufficient tokens")
+            try:
+                results = await handle_race_message(channel, self.renderer)
+            except Exception as error:
+                print(f"Unable to run horse race: {error}")
+                settled = True
+                await self.refund_bets(lobby)
+                await channel.send(
+                    content="The horse race was cancelled, bets refunded"
+                )
+                return
 
-        self.bot.token_manager.update_tokens(author_id, -amount)
+            # Once started, the payout completes even if the lobby is cancelled
+            settled = True
+            winnings = settle_bets(lobby.bets, results)
 
-        results = await handle_race_message(ctx)
+            try:
+                await asyncio.shield(
+                    self.update_balances(lobby.state, winnings, "gamble win")
+                )
+            except Exception as error:
+                print(f"Unable to pay out horse race winnings {winnings}: {error}")
+                await channel.send(
+                    content="The horse race winnings could not be paid out"
+                )
+                return
+        finally:
+            if self.lobbies.get(channel.id) is lobby:
+                del self.lobbies[channel.id]
 
-        nr_tokens_won = get_gamble_result(results, row - 1, amount)
-        self.bot.token_manager.update_tokens(author_id, nr_tokens_won)
+            if not settled:
+                await self.refund_bets(lobby)
 
+        lines = [
+            f"{bet.player_name} won {get_gamble_result(results, bet.row, bet.amount)}"
+            f" token(s)!"
+            for bet in lobby.bets
+        ]
         result_embed = get_embed(
             "Horse Race Results",
-            f"{author_name} won {nr_tokens_won} token(s)!",
+            "\n".join(lines),
             discord.Color.gold(),
         )
-        await ctx.send(embed=result_embed)
+        await channel.send(embed=result_embed)
+
+    async def refund_bets(self, lobby: RaceLobby):
+        refunds = {}
+        for bet in lobby.bets:
+            refunds[bet.player_id] = refunds.get(bet.player_id, 0) + bet.amount
+
+        if not refunds:
+            return
+
+        try:
+            await asyncio.shield(
+                self.update_balances(lobby.state, refunds, "gamble refund")
+            )
+        except Exception as error:
+            print(f"Unable to refund horse race bets {refunds}: {error}")
+
+    async def update_balances(
+        self, state: GuildState, deltas: Dict[int, int], reason: str
+    ):
+        async with state.player_locks.hold(*deltas):
+            await asyncio.to_thread(
+                state.token_manager.update_tokens_many, deltas, reason
+            )
 
     @gamble.error
     async def gamble_error(self, ctx: commands.Context, error):
@@ -56,7 +216,9 @@ class GambleCog(commands.Cog):
             await ctx.send(content=f"`!gamble` error: {error}")
 
 
-async def handle_race_message(ctx: commands.Context):
+async def handle_race_message(
+    channel: discord.abc.Messageable, renderer: RaceRenderer
+):
     # Race variables
     values = [0, 0, 0, 0]
     length = 20
@@ -67,32 +229,41 @@ async def handle_race_message(ctx: commands.Context):
         get_race_string(values, [], symbols, length),
         discord.Color.purple(),
     )
-    message = await ctx.send(embed=embed)
+    message = await channel.send(embed=embed)
+
+    # Simulate the whole race up front, the renderer only replays it. The first
+    # race also imports NumPy, so both run off the event loop.
+    frames, standings = await asyncio.to_thread(
+        get_race_frames, values, symbols, length
+    )
+
+    await renderer.play(message, embed, frames)
+
+    return standings
 
-    for cur_values, cur_standings in simulate_race(values, length):
-        updated_message = embed.copy()
-        updated_message.description = get_race_string(
-            cur_values, cur_standings, symbols, length
-        )
-        await message.edit(embed=updated_message)
 
-        embed = updated_message
-        await asyncio.sleep(0.1)
+def get_race_frames(
+    values: List[int], symbols: List[str], length: int
+) -> Tuple[List[str], List[int]]:
+    frames = []
+    for cur_values, cur_standings in simulate_race(values, length):
+        frames.append(get_race_string(cur_values, cur_standings, symbols, length))
 
-    return cur_standings
+    return frames, cur_standings
 
 
 def simulate_race(values: List[int], length: int):
+    # NumPy takes ~100 ms to import, defer it to the first race
+    import race_sim
+
     standings = []
-    below_threshold = set(range(len(values)))
+    trajectory = race_sim.simulate_trajectory([length - value for value in values])
 
-    # Increment a random element until every horse has reached the goal
-    while below_threshold:
-        index = random.choice(list(below_threshold))
+    # Replay the precomputed moves until every horse has reached the goal
+    for index in trajectory.tolist():
         values[index] += 1
 
         if values[index] >= length:
-            below_threshold.remove(index)
             standings.append(index)
 
         yield values, standings
@@ -127,7 +298,30 @@ def get_race_string(
     return "\n\n".join(lines)
 
 
+def settle_bets(bets: List[Bet], standings: List[int]) -> Dict[int, int]:
+    """
+    Sums the winnings of every bet placed on a race by player.
+
+    Parameters:
+    - bets (List[Bet]): The bets placed on the race.
+    - standings (List[int]): The rows in the order they finished.
+
+    Returns:
+    - Dict[int, int]: The number of tokens won by each player.
+    """
+    winnings = {}
+
+    for bet in bets:
+        nr_tokens_won = get_gamble_result(standings, bet.row, bet.amount)
+        winnings[bet.player_id] = winnings.get(bet.player_id, 0) + nr_tokens_won
+
+    return winnings
+
+
 def get_gamble_result(standings: List[int], row: int, amount: int) -> int:
     bet_result_index = standings.index(row)
-    winnings_table = {0: 2, 1: 1.5, 2: 0.5, 3: 0}
-    return math.floor(winnings_table[bet_result_index] * amount)
+    return math.floor(GAMBLE_WINNINGS_TABLE[bet_result_index] * amount)
+
+
+async def setup(bot):
+    await bot.add_cog(GambleCog(bot))
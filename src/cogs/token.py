@@ -1,15 +1,29 @@
+import asyncio
+import math
 import discord
 from discord.ext import commands
 
+from guilds import guild_cooldown
+from helper import get_embed
+from managers import InsufficientTokensError
+
+PAGE_SIZE = 10
+
 
 class TokenCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_check(self, ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
+
     @commands.command()
     async def send(self, ctx, user: discord.User, amount: int):
         author_id = ctx.author.id
-        author_tokens = self.bot.token_manager.get_tokens(author_id)
+        state = self.bot.guild_states.get(ctx.guild)
+        token_manager = state.token_manager
 
         if author_id == user.id:
             raise commands.BadArgument("Cannot send tokens to yourself")
@@ -17,11 +31,16 @@ class TokenCog(commands.Cog):
         if amount < 1:
             raise commands.BadArgument("Cannot send less than 1 token")
 
-        if author_tokens < amount:
-            raise commands.BadArgument("Insufficient tokens")
+        async with state.player_locks.hold(author_id, user.id):
+            if token_manager.get_tokens(author_id) < amount:
+                raise commands.BadArgument("Insufficient tokens")
 
-        self.bot.token_manager.update_tokens(author_id, -amount)
-        self.bot.token_manager.update_tokens(user.id, amount)
+            try:
+                await asyncio.to_thread(
+                    token_manager.transfer, author_id, user.id, amount, "send"
+                )
+            except InsufficientTokensError as error:
+                raise commands.BadArgument("Insufficient tokens") from error
 
         await ctx.send(content=f"Gave {user.name} {amount} token(s)")
 
@@ -31,15 +50,21 @@ class TokenCog(commands.Cog):
             await ctx.send(content=f"`!send` error: {error}")
 
     @commands.command()
-    @commands.cooldown(1, 10, commands.BucketType.user)
+    @commands.dynamic_cooldown(guild_cooldown(10), commands.BucketType.member)
     async def register(self, ctx: commands.Context):
         author_id = ctx.author.id
         author_name = ctx.author.name
 
-        if self.bot.token_manager.has_player(author_id):
-            raise commands.CommandError(f"{author_name} already registered")
+        state = self.bot.guild_states.get(ctx.guild)
+
+        async with state.player_locks.hold(author_id):
+            if state.token_manager.has_player(author_id):
+                raise commands.CommandError(f"{author_name} already registered")
+
+            await asyncio.to_thread(
+                state.token_manager.set_tokens, author_id, 0, "register"
+            )
 
-        self.bot.token_manager.set_tokens(author_id, 0)
         await ctx.send(content=f"Registered {author_name}")
 
     @register.error
@@ -48,8 +73,66 @@ class TokenCog(commands.Cog):
             await ctx.send(content=f"`!register` error: {error}")
 
     @commands.command()
-    @commands.cooldown(1, 10, commands.BucketType.user)
+    @commands.dynamic_cooldown(guild_cooldown(10), commands.BucketType.member)
     async def tokens(self, ctx: commands.Context):
         author_id = ctx.author.id
-        author_tokens = self.bot.token_manager.get_tokens(author_id)
+        token_manager = self.bot.guild_states.get(ctx.guild).token_manager
+        author_tokens = token_manager.get_tokens(author_id)
         await ctx.send(content=f"You have {author_tokens} tokens")
+
+    @commands.command()
+    @commands.dynamic_cooldown(guild_cooldown(10), commands.BucketType.member)
+    async def leaderboard(self, ctx: commands.Context, page: int = 1):
+        token_manager = self.bot.guild_states.get(ctx.guild).token_manager
+        nr_pages = max(1, math.ceil(token_manager.get_player_count() / PAGE_SIZE))
+
+        if not 1 <= page <= nr_pages:
+            raise commands.BadArgument(f"Page must be between 1 and {nr_pages}")
+
+        entries = token_manager.get_page(page - 1, PAGE_SIZE)
+        first_rank = (page - 1) * PAGE_SIZE + 1
+        lines = [
+            f"{first_rank + i}. <@{player_id}>: {balance} tokens"
+            for i, (player_id, balance) in enumerate(entries)
+        ]
+
+        embed = get_embed(
+            f"Leaderboard ({page}/{nr_pages})",
+            "\n".join(lines) or "No players registered",
+            discord.Color.gold(),
+        )
+        await ctx.send(embed=embed)
+
+    @leaderboard.error
+    async def leaderboard_error(self, ctx: commands.Context, error):
+        if isinstance(error, commands.BadArgument):
+            await ctx.send(content=f"`!leaderboard` error: {error}")
+
+    @commands.command()
+    @commands.dynamic_cooldown(guild_cooldown(10), commands.BucketType.member)
+    async def profile(self, ctx: commands.Context, user: discord.User = None):
+        user = user or ctx.author
+        token_manager = self.bot.guild_states.get(ctx.guild).token_manager
+        rank = token_manager.get_rank(user.id)
+
+        if rank is None:
+            raise commands.CommandError(f"{user.name} is not registered")
+
+        embed = get_embed(
+            user.name,
+            (
+                f"{token_manager.get_tokens(user.id)} tokens\n"
+                f"Rank {rank} of {token_manager.get_player_count()}"
+            ),
+            discord.Color.blurple(),
+        )
+        await ctx.send(embed=embed)
+
+    @profile.error
+    async def profile_error(self, ctx: commands.Context, error):
+        if isinstance(error, commands.CommandError):
+            await ctx.send(content=f"`!profile` error: {error}")
+
+
+async def setup(bot):
+    await bot.add_cog(TokenCog(bot))
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CompletionWatcher:
+    """
+    Polls watched puzzles one at a time: often right after they are posted, then
+    less and less often, until the poll reports that the puzzle is done
+    """
+
+    def __init__(
+        self,
+        poll: Callable[[Hashable], Awaitable[bool]],
+        initial_delay: float = 60,
+        max_delay: float = 30 * 60,
+        backoff: float = 1.5,
+    ):
+        self.poll = poll
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+
+        # Per key: when to poll next, and the delay that led to it
+        self._watched: Dict[Hashable, Tuple[float, float]] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, key: Hashable):
+        """
+        Starts polling `key`, unless it is already watched.
+
+        Parameters:
+        - key (Hashable): Passed to `poll`, which returns True once the puzzle is
+          complete or no longer needs watching.
+        """
+        if key in self._watched:
+            return
+
+        due = asyncio.get_running_loop().time() + self.initial_delay
+        self._watched[key] = (due, self.initial_delay)
+        self._changed.set()
+
+    def unwatch(self, key: Hashable):
+        self._watched.pop(key, None)
+        self._changed.set()
+
+    def is_watching(self, key: Hashable) -> bool:
+        return key in self._watched
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _wait(self, timeout: Optional[float]):
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if not self._watched:
+                await self._wait(None)
+                continue
+
+            key, (due, delay) = min(self._watched.items(), key=lambda item: item[1])
+            remaining = due - loop.time()
+
+            # Sleep until the earliest poll, or until the watched set changes
+            if remaining > 0:
+                await self._wait(remaining)
+                continue
+
+            try:
+                done = await self.poll(key)
+            except Exception as error:
+                print(f"Unable to poll watched puzzle {key}: {error}")
+                done = False
+
+            if done:
+                self._watched.pop(key, None)
+            elif key in self._watched:
+                delay = min(self.max_delay, delay * self.backoff)
+                self._watched[key] = (loop.time() + delay, delay)
@@ -1,5 +1,36 @@
 CHANNEL_ID = 1184096292905943120
 
+# New puzzles are published at midnight in this time zone
+PUZZLE_TIMEZONE = "America/New_York"
+
+# Tokens rewarded for completing a crossword by weekday, before the time bonus
+PUZZLE_DAY_REWARDS = {
+    "Monday": 1,
+    "Tuesday": 2,
+    "Wednesday": 3,
+    "Thursday": 4,
+    "Friday": 5,
+    "Saturday": 6,
+    "Sunday": 10,
+}
+
+# How many days back !wapo can fetch puzzles, all fetched in one browser session
+ARCHIVE_DAYS = 7
+# How long a date missing from the archive is not fetched again
+ARCHIVE_MISS_SECONDS = 5 * 60
+# How long !wapo serves the previous puzzle before checking for today's again
+UNPUBLISHED_RETRY_SECONDS = 5 * 60
+
+# Completion watcher: first poll after posting, slowest poll, and growth factor
+WATCH_INITIAL_SECONDS = 60
+WATCH_MAX_SECONDS = 30 * 60
+WATCH_BACKOFF = 1.5
+
+# Payout multiplier by finishing position (0 is first place)
+GAMBLE_WINNINGS_TABLE = {0: 2, 1: 1.5, 2: 0.5, 3: 0}
+# Bets placed within this many seconds of each other share one race
+RACE_LOBBY_SECONDS = 10
+
 GITHUB_REPOSITORY = "erikwessman/wapo"
 GITHUB_ICON = "https://github.githubassets.com/assets/GitHub-Mark-ea2971cee799.png"
 
@@ -7,3 +38,4 @@ EMOJI_ROCKET = "\U0001F680"
 EMOJI_PENGUIN = "\U0001F427"
 EMOJI_OCTOPUS = "\U0001F419"
 EMOJI_SANTA = "\U0001F385"
+EMOJI_HORSE_RACING = "\U0001F3C7"
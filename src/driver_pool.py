@@ -0,0 +1,125 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no browser session becomes available in time
+    """
+
+
+class PooledDriver:
+    """
+    A browser session owned by a DriverPool
+    """
+
+    def __init__(self, driver: Any):
+        self.driver = driver
+        self.uses = 0
+        # Whether the cookie consent dialog has been accepted in this session
+        self.consented = False
+        # Set when the session misbehaved and should not be reused
+        self.discard = False
+
+
+class DriverPool:
+    """
+    A bounded pool of warm WebDriver sessions.
+
+    Sessions are checked out with `session()`, health checked before reuse and
+    replaced after `max_uses` checkouts, when the caller raises or when the caller
+    sets `discard` on the session.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 2,
+        max_uses: int = 25,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[PooledDriver] = []
+        self._closed = False
+
+    @contextmanager
+    def session(self, timeout: float = None):
+        """
+        Checks out a browser session for the duration of the `with` block.
+
+        Parameters:
+        - timeout (float, optional): Seconds to wait for a free session. Waits
+          indefinitely by default.
+
+        Raises:
+        - PoolTimeoutError: If no session became available within `timeout`.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError("No browser session available")
+
+        try:
+            pooled = self._checkout()
+
+            try:
+                yield pooled
+            except BaseException:
+                self._quit(pooled)
+                raise
+
+            pooled.uses += 1
+            self._checkin(pooled)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Quits every idle session. Sessions checked out at the time are quit when
+        they are returned.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        for pooled in idle:
+            self._quit(pooled)
+
+    def _checkout(self) -> PooledDriver:
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+
+            if pooled is None:
+                return PooledDriver(self.factory())
+
+            if self._is_healthy(pooled):
+                return pooled
+
+            self._quit(pooled)
+
+    def _checkin(self, pooled: PooledDriver):
+        with self._lock:
+            reusable = not pooled.discard and pooled.uses < self.max_uses
+
+            if reusable and not self._closed:
+                self._idle.append(pooled)
+                return
+
+        self._quit(pooled)
+
+    def _is_healthy(self, pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as error:
+            print(f"Unable to quit browser session: {error}")
@@ -0,0 +1,160 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+from const import CHANNEL_ID
+from managers import (
+    CrosswordManager,
+    GuildConfigManager,
+    MessageManager,
+    PuzzleManager,
+    TokenManager,
+)
+from player_locks import PlayerLocks
+from storage import SqliteDatabase, SqliteKeyValueStorage, SqliteTokenStorage
+
+
+@dataclass
+class GuildState:
+    """
+    The ledgers, settings and balance locks of one guild
+    """
+
+    token_manager: TokenManager
+    crossword_manager: CrosswordManager
+    puzzle_manager: PuzzleManager
+    message_manager: MessageManager
+    config: GuildConfigManager
+    player_locks: PlayerLocks = field(default_factory=PlayerLocks)
+
+    def compact(self):
+        self.token_manager.compact()
+
+    def close(self):
+        self.token_manager.close()
+        self.crossword_manager.close()
+        self.puzzle_manager.close()
+        self.message_manager.close()
+        self.config.close()
+
+
+class GuildStates:
+    """
+    Opens the state of each guild the first time one of its events is handled,
+    so a bot process only touches the files of the guilds it actually serves.
+
+    The guild that owns `legacy_channel_id` keeps the original top-level files.
+    Every other guild gets its own directory, `<data_dir>/guilds/<guild id>/`.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "data",
+        tokens_path: str = "data/tokens.json",
+        database_path: Optional[str] = None,
+        legacy_channel_id: int = CHANNEL_ID,
+    ):
+        self.data_dir = data_dir
+        self.tokens_path = tokens_path
+        self.database_path = database_path
+        self.legacy_channel_id = legacy_channel_id
+        self._states: Dict[int, GuildState] = {}
+
+    def _is_legacy(self, guild: discord.Guild) -> bool:
+        return guild.get_channel(self.legacy_channel_id) is not None
+
+    def _directory(self, guild: discord.Guild) -> str:
+        return os.path.join(self.data_dir, "guilds", str(guild.id))
+
+    def get(self, guild: discord.Guild) -> GuildState:
+        state = self._states.get(guild.id)
+
+        if state is None:
+            if self._is_legacy(guild):
+                state = self._open(
+                    self.data_dir,
+                    self.tokens_path,
+                    self.database_path,
+                    self.legacy_channel_id,
+                )
+            else:
+                directory = self._directory(guild)
+                state = self._open(
+                    directory,
+                    os.path.join(directory, os.path.basename(self.tokens_path)),
+                    self.database_path
+                    and os.path.join(directory, os.path.basename(self.database_path)),
+                )
+
+            self._states[guild.id] = state
+
+        return state
+
+    def peek(self, guild: discord.Guild) -> Optional[GuildState]:
+        """
+        Returns the state of a guild that has used the bot, or None without
+        creating any files for a guild that never has.
+        """
+        if (
+            guild.id in self._states
+            or self._is_legacy(guild)
+            or os.path.isdir(self._directory(guild))
+        ):
+            return self.get(guild)
+
+        return None
+
+    def _open(
+        self,
+        directory: str,
+        tokens_path: str,
+        database_path: Optional[str],
+        default_channel_id: Optional[int] = None,
+    ) -> GuildState:
+        if database_path:
+            database = SqliteDatabase(database_path)
+            return GuildState(
+                TokenManager(SqliteTokenStorage(database)),
+                CrosswordManager(SqliteKeyValueStorage(database, "crosswords")),
+                PuzzleManager(SqliteKeyValueStorage(database, "puzzles")),
+                MessageManager(SqliteKeyValueStorage(database, "messages")),
+                GuildConfigManager(
+                    SqliteKeyValueStorage(database, "config"), default_channel_id
+                ),
+            )
+
+        return GuildState(
+            TokenManager(tokens_path),
+            CrosswordManager(os.path.join(directory, "crosswords.json")),
+            PuzzleManager(os.path.join(directory, "puzzles.json")),
+            MessageManager(os.path.join(directory, "messages.json")),
+            GuildConfigManager(
+                os.path.join(directory, "config.json"), default_channel_id
+            ),
+        )
+
+    def opened(self) -> List[GuildState]:
+        return list(self._states.values())
+
+    def close(self):
+        for state in self._states.values():
+            state.close()
+        self._states.clear()
+
+
+def guild_cooldown(default_seconds: float):
+    """
+    Builds a cooldown for `commands.dynamic_cooldown` that reads the number of
+    seconds from the guild's settings, falling back to `default_seconds`.
+    """
+
+    def get_cooldown(ctx: commands.Context) -> Optional[commands.Cooldown]:
+        config = ctx.bot.guild_states.get(ctx.guild).config
+        seconds = config.get_cooldown(ctx.command.qualified_name, default_seconds)
+
+        return commands.Cooldown(1, seconds) if seconds > 0 else None
+
+    return get_cooldown
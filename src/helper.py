@@ -1,10 +1,16 @@
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import calendar
-import validators
+from typing import Dict
 import discord
 
-from const import GITHUB_REPOSITORY, GITHUB_ICON
+from const import (
+    GITHUB_REPOSITORY,
+    GITHUB_ICON,
+    PUZZLE_DAY_REWARDS,
+    PUZZLE_TIMEZONE,
+)
 
 
 def get_embed(
@@ -15,6 +21,21 @@ def get_embed(
     return embed
 
 
+def get_puzzle_id(url: str) -> str:
+    """
+    Extracts the id of the crossword puzzle from its URL.
+
+    Parameters:
+    - url (str): The URL of the crossword puzzle.
+
+    Returns:
+    - str: The puzzle id, e.g. "tca231219".
+    """
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    return query_params["id"][0]
+
+
 def get_puzzle_date(url: str) -> str:
     """
     Extracts the date of the crossword puzzle from its URL.
@@ -25,13 +46,89 @@ def get_puzzle_date(url: str) -> str:
     Returns:
     - str: The date of the crossword in the format "DD-MM-YYYY".
     """
-    parsed_url = urlparse(url)
-    query_params = parse_qs(parsed_url.query)
-    puzzle_id = query_params["id"][0]
+    return get_puzzle_id_date(get_puzzle_id(url))
+
+
+def get_puzzle_id_date(puzzle_id: str) -> str:
+    """
+    Extracts the date of the crossword puzzle from its id.
+
+    Parameters:
+    - puzzle_id (str): The puzzle id, e.g. "tca231219".
+
+    Returns:
+    - str: The date of the crossword in the format "DD-MM-YYYY".
+    """
     date_str = puzzle_id.removeprefix("tca")
     return f"{date_str[4:6]}-{date_str[2:4]}-20{date_str[0:2]}"
 
 
+def get_current_puzzle_date(now: datetime = None) -> str:
+    """
+    Determines the date of the latest published crossword puzzle.
+
+    Parameters:
+    - now (datetime, optional): A timezone-aware point in time. Defaults to now.
+
+    Returns:
+    - str: The date of the latest crossword in the format "DD-MM-YYYY".
+    """
+    now = now or datetime.now(tz=ZoneInfo(PUZZLE_TIMEZONE))
+    return now.astimezone(ZoneInfo(PUZZLE_TIMEZONE)).strftime("%d-%m-%Y")
+
+
+def resolve_puzzle_date(day: str, now: datetime = None, max_days: int = 7) -> str:
+    """
+    Finds the date of the puzzle a player asked for.
+
+    Parameters:
+    - day (str): A weekday ("tuesday", "tue"), "today", "yesterday", or a date in
+      the format "DD-MM-YYYY" or "YYYY-MM-DD".
+    - now (datetime, optional): A timezone-aware point in time. Defaults to now.
+    - max_days (int, optional): How many days back puzzles may be requested.
+
+    Returns:
+    - str: The date of the puzzle in the format "DD-MM-YYYY". A weekday resolves
+      to its most recent occurrence, today included.
+
+    Raises:
+    - ValueError: If `day` is not understood, in the future or older than
+      `max_days` days.
+    """
+    latest = datetime.strptime(get_current_puzzle_date(now), "%d-%m-%Y")
+    day = day.strip().lower()
+
+    weekdays = [name.lower() for name in calendar.day_name]
+    abbreviations = [name.lower() for name in calendar.day_abbr]
+
+    if day == "today":
+        date_obj = latest
+    elif day == "yesterday":
+        date_obj = latest - timedelta(days=1)
+    elif day in weekdays or day in abbreviations:
+        weekday = weekdays.index(day) if day in weekdays else abbreviations.index(day)
+        date_obj = latest - timedelta(days=(latest.weekday() - weekday) % 7)
+    else:
+        for date_format in ("%d-%m-%Y", "%Y-%m-%d"):
+            try:
+                date_obj = datetime.strptime(day, date_format)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(f"Unknown day {day}")
+
+    days_ago = (latest - date_obj).days
+
+    if days_ago < 0:
+        raise ValueError("That puzzle is not published yet")
+
+    if days_ago >= max_days:
+        raise ValueError(f"Only the last {max_days} days of puzzles are available")
+
+    return date_obj.strftime("%d-%m-%Y")
+
+
 def get_puzzle_weekday(date_str: str) -> str:
     """
     Determines the day of the week for a given date string.
@@ -47,30 +144,39 @@ def get_puzzle_weekday(date_str: str) -> str:
     return day_of_week
 
 
-def get_puzzle_reward(day: str, complete_time: int) -> int:
+def parse_puzzle_time(clock_str: str) -> int:
+    """
+    Parses the solve time shown on a completed crossword puzzle.
+
+    Parameters:
+    - clock_str (str): The time in the format "X minutes and Y seconds".
+
+    Returns:
+    - int: The time in seconds.
+    """
+    parts = clock_str.split(" ")
+    numbers = [p for p in parts if p.isdigit()]
+
+    return int(numbers[0]) * 60 + int(numbers[1])
+
+
+def get_puzzle_reward(
+    day: str, complete_time: int, day_rewards: Dict[str, int] = PUZZLE_DAY_REWARDS
+) -> int:
     """
     Calculates the reward score for completing a crossword puzzle based on the day and completion time.
 
     Parameters:
     - day (str): The day of the week when the crossword puzzle was completed.
     - complete_time (int): The time taken to complete the puzzle in seconds.
+    - day_rewards (Dict[str, int], optional): The base score by weekday.
 
     Returns:
     - int: The calculated reward score.
     """
-    day_score_table = {
-        "Monday": 1,
-        "Tuesday": 2,
-        "Wednesday": 3,
-        "Thursday": 4,
-        "Friday": 5,
-        "Saturday": 6,
-        "Sunday": 10,
-    }
-
     time_multiplier_table = {5 * 60: 5, 7 * 60: 4, 10 * 60: 3, 15 * 60: 2}
 
-    score = day_score_table[day]
+    score = day_rewards[day]
 
     for time_s in time_multiplier_table:
         if complete_time <= time_s:
@@ -78,16 +184,3 @@ def get_puzzle_reward(day: str, complete_time: int) -> int:
             break
 
     return score
-
-
-def is_message_url(message: str) -> bool:
-    """
-    Determines whether a given message string is a valid URL.
-
-    Parameters:
-    - message (str): The message string to be validated.
-
-    Returns:
-    - bool: True if the message is a valid URL, False otherwise.
-    """
-    return validators.url(message)
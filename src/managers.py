@@ -1,58 +1,178 @@
-import json
-import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sortedcontainers import SortedList
+
+from const import PUZZLE_DAY_REWARDS
+from storage import (
+    InsufficientTokensError,
+    KeyValueStorage,
+    TokenStorage,
+    open_key_value_storage,
+    open_token_storage,
+)
+
+# InsufficientTokensError is re-exported for the cogs
+__all__ = [
+    "InsufficientTokensError",
+    "TokenManager",
+    "CrosswordManager",
+    "PuzzleManager",
+    "MessageManager",
+    "GuildConfigManager",
+]
 
 
 class TokenManager:
     """
-    Manages players' tokens persistently
+    Manages players' tokens persistently, keeping them ranked by balance
     """
 
-    def __init__(self, file_path: str):
-        self.file_path = file_path
+    def __init__(self, storage: Union[str, TokenStorage]):
+        if isinstance(storage, str):
+            storage = open_token_storage(storage)
 
-        if not os.path.exists(file_path):
-            with open(file_path, "w") as file:
-                json.dump({}, file)
+        self.storage = storage
 
-    def _read_data(self):
-        with open(self.file_path, "r") as file:
-            return json.load(file)
+        # Ranking entries are (-(balance - offset), player_id), so the richest
+        # player comes first and ties are ordered by id. Rewarding every player
+        # shifts all balances equally, which only changes the offset.
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._entries: Dict[str, Tuple[int, str]] = {}
+        self._ranking = SortedList()
 
-    def _write_data(self, data):
-        with open(self.file_path, "w") as file:
-            json.dump(data, file, indent=4)
+        for player_id, balance in storage.get_balances().items():
+            self._index(player_id, balance)
 
-    def update_tokens(self, player_id: int, nr_tokens: int):
-        data = self._read_data()
+    def _index(self, player_id: str, balance: int):
+        entry = self._entries.pop(player_id, None)
+        if entry is not None:
+            self._ranking.remove(entry)
 
-        player_id_str = str(player_id)
-        current_tokens = data.get(player_id_str, 0)
-        data[player_id] = current_tokens + nr_tokens
+        entry = (self._offset - balance, player_id)
+        self._entries[player_id] = entry
+        self._ranking.add(entry)
 
-        self._write_data(data)
+    def _get_balance(self, entry: Tuple[int, str]) -> int:
+        return self._offset - entry[0]
 
-    def set_tokens(self, player_id: int, nr_tokens: int):
-        data = self._read_data()
+    def update_tokens(self, player_id: int, nr_tokens: int, reason: str = ""):
+        self.update_tokens_many({player_id: nr_tokens}, reason)
 
-        player_id_str = str(player_id)
-        data[player_id_str] = nr_tokens
+    def update_tokens_many(self, deltas: Dict[int, int], reason: str = ""):
+        """
+        Applies several token changes as a single all-or-nothing update.
 
-        self._write_data(data)
+        Parameters:
+        - deltas (Dict[int, int]): Maps player ids to the number of tokens to add
+          (negative to remove).
+        - reason (str, optional): Why the balances changed, kept by backends that
+          record an audit trail.
 
-    def get_tokens(self, player_id: int):
-        data = self._read_data()
+        Raises:
+        - InsufficientTokensError: If a removal would leave a player with a negative
+          balance. No change is applied in that case.
+        """
+        deltas = {str(player_id): nr_tokens for player_id, nr_tokens in deltas.items()}
+
+        with self._lock:
+            self.storage.apply_deltas(deltas, reason)
+
+            for player_id in deltas:
+                self._index(player_id, self.storage.get_tokens(player_id))
+
+    def reward_all(self, nr_tokens: int, reason: str = "") -> int:
+        """
+        Gives every registered player the same number of tokens in one update.
+
+        Parameters:
+        - nr_tokens (int): The number of tokens to give each player.
+        - reason (str, optional): Why the tokens were given.
+
+        Returns:
+        - int: The number of players rewarded.
+        """
+        with self._lock:
+            nr_players = self.storage.add_to_all(nr_tokens, reason)
+            self._offset += nr_tokens
 
-        player_id_str = str(player_id)
-        return data.get(player_id_str, 0)
+        return nr_players
+
+    def transfer(
+        self, from_player_id: int, to_player_id: int, nr_tokens: int, reason: str = ""
+    ):
+        """
+        Moves tokens from one player to another atomically.
+
+        Raises:
+        - InsufficientTokensError: If the sender has fewer than `nr_tokens` tokens.
+        """
+        self.update_tokens_many(
+            {from_player_id: -nr_tokens, to_player_id: nr_tokens}, reason
+        )
+
+    def set_tokens(self, player_id: int, nr_tokens: int, reason: str = "set"):
+        with self._lock:
+            self.storage.set_tokens(str(player_id), nr_tokens, reason)
+            self._index(str(player_id), nr_tokens)
+
+    def get_tokens(self, player_id: int):
+        return self.storage.get_tokens(str(player_id))
 
     def get_players(self):
-        data = self._read_data()
+        return self.storage.get_players()
 
-        return list(data.keys())
+    def get_player_count(self) -> int:
+        return len(self._ranking)
 
     def has_player(self, player_id: int) -> bool:
-        data = self._read_data()
-        return player_id in data
+        return self.storage.has_player(str(player_id))
+
+    def get_rank(self, player_id: int) -> Optional[int]:
+        """
+        Returns a player's position in the ranking, 1 being the richest. Players
+        with the same balance share a rank.
+
+        Returns:
+        - Optional[int]: The rank, or None if the player is not registered.
+        """
+        with self._lock:
+            entry = self._entries.get(str(player_id))
+
+            if entry is None:
+                return None
+
+            return self._ranking.bisect_left((entry[0],)) + 1
+
+    def get_page(self, page: int, page_size: int = 10) -> List[Tuple[str, int]]:
+        """
+        Returns one page of the ranking.
+
+        Parameters:
+        - page (int): The page number, starting at 0.
+        - page_size (int, optional): The number of players per page.
+
+        Returns:
+        - List[Tuple[str, int]]: (player_id, balance) pairs, richest first.
+        """
+        start = page * page_size
+
+        with self._lock:
+            entries = self._ranking.islice(start, start + page_size)
+            return [(entry[1], self._get_balance(entry)) for entry in entries]
+
+    def get_top(self, nr_players: int) -> List[Tuple[str, int]]:
+        return self.get_page(0, nr_players)
+
+    def compact(self):
+        self.storage.compact()
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
 
 
 class CrosswordManager:
@@ -60,33 +180,142 @@ class CrosswordManager:
     Manages completed crosswords persistently
     """
 
-    def __init__(self, file_path: str):
-        self.file_path = file_path
+    def __init__(self, storage: Union[str, KeyValueStorage]):
+        if isinstance(storage, str):
+            storage = open_key_value_storage(storage, "crosswords")
 
-        if not os.path.exists(file_path):
-            with open(file_path, "w") as file:
-                json.dump({}, file)
+        self.storage = storage
 
-    def _read_data(self):
-        with open(self.file_path, "r") as file:
-            return json.load(file)
+    def save_crossword(self, crossword_date):
+        self.storage.set(crossword_date, True)
 
-    def _write_data(self, data):
-        with open(self.file_path, "w") as file:
-            json.dump(data, file, indent=4)
+    def get_crosswords(self):
+        return self.storage.keys()
 
-    def save_crossword(self, crossword_date):
-        data = self._read_data()
+    def has_crossword(self, crossword_date):
+        return self.storage.has(crossword_date)
 
-        data[crossword_date] = True
+    def flush(self):
+        self.storage.flush()
 
-        self._write_data(data)
+    def close(self):
+        self.storage.close()
 
-    def get_crosswords(self):
-        data = self._read_data()
 
-        return list(data.keys())
+class PuzzleManager:
+    """
+    Caches generated puzzle URLs by puzzle date persistently
+    """
 
-    def has_crossword(self, crossword_date):
-        data = self._read_data()
-        return crossword_date in data
+    def __init__(self, storage: Union[str, KeyValueStorage]):
+        if isinstance(storage, str):
+            storage = open_key_value_storage(storage, "puzzles")
+
+        self.storage = storage
+
+    def save_puzzle_url(self, puzzle_date: str, url: str):
+        self.storage.set(puzzle_date, url)
+
+    def get_puzzle_url(self, puzzle_date: str):
+        return self.storage.get(puzzle_date)
+
+    def has_puzzle(self, puzzle_date: str) -> bool:
+        return self.storage.has(puzzle_date)
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
+
+
+class MessageManager:
+    """
+    Indexes the puzzle messages posted by the bot persistently, so reactions can
+    be matched to a puzzle without fetching the message
+    """
+
+    def __init__(self, storage: Union[str, KeyValueStorage]):
+        if isinstance(storage, str):
+            storage = open_key_value_storage(storage, "messages")
+
+        self.storage = storage
+        self._message_ids: Set[int] = {int(key) for key in storage.keys()}
+
+    def save_puzzle_message(self, message_id: int, url: str, puzzle_date: str):
+        self.storage.set(str(message_id), {"url": url, "date": puzzle_date})
+        self._message_ids.add(message_id)
+
+    def is_puzzle_message(self, message_id: int) -> bool:
+        return message_id in self._message_ids
+
+    def get_puzzle_message(self, message_id: int) -> Optional[Dict[str, str]]:
+        """
+        Returns the puzzle posted in a message.
+
+        Returns:
+        - Optional[Dict[str, str]]: The puzzle's "url" and "date", or None if the
+          message is not a puzzle message.
+        """
+        if message_id not in self._message_ids:
+            return None
+
+        return self.storage.get(str(message_id))
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
+
+
+class GuildConfigManager:
+    """
+    Stores a guild's settings persistently: its crossword channel, command
+    cooldowns and crossword rewards
+    """
+
+    def __init__(
+        self,
+        storage: Union[str, KeyValueStorage],
+        default_channel_id: Optional[int] = None,
+    ):
+        if isinstance(storage, str):
+            storage = open_key_value_storage(storage, "config")
+
+        self.storage = storage
+        self.default_channel_id = default_channel_id
+
+    def get_channel_id(self) -> Optional[int]:
+        return self.storage.get("channel_id", self.default_channel_id)
+
+    def set_channel_id(self, channel_id: int):
+        self.storage.set("channel_id", channel_id)
+
+    def get_cooldown(self, command: str, default: float) -> float:
+        return self.storage.get("cooldowns", {}).get(command, default)
+
+    def set_cooldown(self, command: str, seconds: float):
+        cooldowns = dict(self.storage.get("cooldowns", {}))
+        cooldowns[command] = seconds
+        self.storage.set("cooldowns", cooldowns)
+
+    def get_watch(self) -> bool:
+        return self.storage.get("watch", False)
+
+    def set_watch(self, enabled: bool):
+        self.storage.set("watch", enabled)
+
+    def get_day_rewards(self) -> Dict[str, int]:
+        return {**PUZZLE_DAY_REWARDS, **self.storage.get("day_rewards", {})}
+
+    def set_day_reward(self, day: str, nr_tokens: int):
+        day_rewards = dict(self.storage.get("day_rewards", {}))
+        day_rewards[day] = nr_tokens
+        self.storage.set("day_rewards", day_rewards)
+
+    def flush(self):
+        self.storage.flush()
+
+    def close(self):
+        self.storage.close()
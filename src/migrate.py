@@ -0,0 +1,65 @@
+"""
+One-shot migration of the JSON token ledger and crossword registry to SQLite.
+
+Usage: python src/migrate.py data/tokens.json data/crosswords.json data/wapo.db
+"""
+
+import argparse
+import json
+
+from storage import SqliteDatabase, SqliteKeyValueStorage, SqliteTokenStorage
+
+
+def migrate_json_to_sqlite(tokens_path: str, crosswords_path: str, db_path: str):
+    """
+    Copies the JSON token ledger and crossword registry into an SQLite database.
+    Everything is written in one transaction, so a failed migration leaves the
+    database untouched.
+
+    Parameters:
+    - tokens_path (str): Path of the JSON token ledger.
+    - crosswords_path (str): Path of the JSON crossword registry.
+    - db_path (str): Path of the SQLite database to create or update.
+
+    Returns:
+    - tuple: The number of players and crosswords migrated.
+    """
+    with open(tokens_path, "r") as file:
+        tokens = json.load(file)
+
+    with open(crosswords_path, "r") as file:
+        crosswords = json.load(file)
+
+    database = SqliteDatabase(db_path)
+    token_storage = SqliteTokenStorage(database)
+    crossword_storage = SqliteKeyValueStorage(database, "crosswords")
+
+    try:
+        with database.transaction() as connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {token_storage.table} (player_id, tokens) "
+                "VALUES (?, ?)",
+                [(str(player_id), nr_tokens) for player_id, nr_tokens in tokens.items()],
+            )
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {crossword_storage.table} (key, value) "
+                "VALUES (?, ?)",
+                [(date, json.dumps(value)) for date, value in crosswords.items()],
+            )
+    finally:
+        database.close()
+
+    return len(tokens), len(crosswords)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("tokens", help="JSON token ledger, e.g. data/tokens.json")
+    parser.add_argument("crosswords", help="JSON registry, e.g. data/crosswords.json")
+    parser.add_argument("database", help="SQLite database to write, e.g. data/wapo.db")
+    args = parser.parse_args()
+
+    nr_players, nr_crosswords = migrate_json_to_sqlite(
+        args.tokens, args.crosswords, args.database
+    )
+    print(f"Migrated {nr_players} players and {nr_crosswords} crosswords")
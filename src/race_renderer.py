@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Dict, List
+
+import discord
+
+
+class EditBudget:
+    """
+    A token bucket of message edits for one channel, shared by every race in it.
+
+    Discord allows roughly five edits per five seconds per channel. discord.py
+    sleeps through rate limits inside `edit()`, so a slow edit means we hit the
+    limit: the refill rate is then halved, and it creeps back up after every
+    fast edit.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 5,
+        min_rate: float = 0.2,
+        slow_edit: float = 1.0,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.slow_edit = slow_edit
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, reserve: int = 0) -> bool:
+        """
+        Takes an edit from the budget if more than `reserve` edits are left.
+        """
+        self._refill()
+
+        if self._tokens - 1 < reserve:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def force_acquire(self):
+        """
+        Takes an edit even if the budget is empty, e.g. for a race result.
+        """
+        self._refill()
+        self._tokens -= 1
+
+    def time_until_available(self, reserve: int = 0) -> float:
+        missing = reserve + 1 - self.available()
+        return max(0.0, missing / self.rate)
+
+    def record_edit(self, seconds: float):
+        if seconds >= self.slow_edit:
+            self.rate = max(self.min_rate, self.rate / 2)
+        else:
+            self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+
+
+class RaceRenderer:
+    """
+    Plays precomputed race frames on a message within a fixed duration, sending
+    only as many edits as the channel's edit budget allows. Frames that cannot be
+    sent in time are skipped, and the final frame is always sent at the deadline.
+    """
+
+    def __init__(self, duration: float = 8.0, min_frame_interval: float = 0.5):
+        self.duration = duration
+        self.min_frame_interval = min_frame_interval
+        self._budgets: Dict[int, EditBudget] = {}
+
+    def get_budget(self, channel_id: int) -> EditBudget:
+        if channel_id not in self._budgets:
+            self._budgets[channel_id] = EditBudget()
+        return self._budgets[channel_id]
+
+    async def _edit(self, message: discord.Message, embed: discord.Embed, budget):
+        start = time.monotonic()
+        await message.edit(embed=embed)
+        budget.record_edit(time.monotonic() - start)
+
+    async def play(
+        self, message: discord.Message, embed: discord.Embed, frames: List[str]
+    ):
+        """
+        Renders `frames` as the description of `embed` on `message`.
+
+        Parameters:
+        - message (discord.Message): The message showing the race.
+        - embed (discord.Embed): The embed to update.
+        - frames (List[str]): Every simulation step, the last one being the result.
+        """
+        budget = self.get_budget(message.channel.id)
+        start = time.monotonic()
+        deadline = start + self.duration
+        last_index = -1
+
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            # Show the step that corresponds to the elapsed time, skipping the
+            # steps in between. One edit is kept in reserve for the result.
+            index = int((now - start) / self.duration * len(frames))
+
+            if index > last_index and index < len(frames) - 1:
+                if budget.try_acquire(reserve=1):
+                    embed.description = frames[index]
+                    await self._edit(message, embed, budget)
+                    last_index = index
+
+            delay = max(self.min_frame_interval, budget.time_until_available(1))
+            await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+
+        budget.force_acquire()
+        embed.description = frames[-1]
+        await self._edit(message, embed, budget)
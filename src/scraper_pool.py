@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import itertools
+import multiprocessing
+import os
+import signal
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
+# Lower values run first
+PRIORITY_URL = 0
+PRIORITY_CHECK = 1
+
+
+class ScraperBusyError(Exception):
+    """
+    Raised when a scrape is rejected because the job queue is full
+    """
+
+
+class ScraperCrashedError(Exception):
+    """
+    Raised when a worker process exits while running a scrape
+    """
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    func: Callable = field(compare=False)
+    args: Tuple = field(compare=False)
+    timeout: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+def _worker_main(conn, on_exit: Optional[Callable[[], Any]]):
+    # Own process group, so killing the worker also kills its browsers
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    # Ctrl+C is handled by the bot, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+
+            if message is None:
+                break
+
+            func, args = message
+
+            try:
+                reply = (True, func(*args))
+            except Exception as error:
+                reply = (False, error)
+
+            try:
+                conn.send(reply)
+            except Exception as error:
+                # The result or exception could not be pickled
+                conn.send((False, ScraperCrashedError(repr(error))))
+    finally:
+        if on_exit is not None:
+            on_exit()
+
+
+class _Worker:
+    """
+    A scraper process and the pipe to it, driven from one thread at a time
+    """
+
+    def __init__(self, context, on_exit: Optional[Callable[[], Any]]):
+        self._context = context
+        self._on_exit = on_exit
+        self.process = None
+        self._conn = None
+
+    def _start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self._on_exit),
+            name="wapo-scraper",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+
+        self.process = process
+        self._conn = parent_conn
+
+    def run(self, func: Callable, args: Tuple, timeout: float) -> Any:
+        if self.process is None or not self.process.is_alive():
+            self.kill()
+            self._start()
+
+        self._conn.send((func, args))
+
+        # poll also returns when the process dies, recv then raises EOFError
+        if not self._conn.poll(timeout):
+            self.kill()
+            raise asyncio.TimeoutError()
+
+        try:
+            ok, value = self._conn.recv()
+        except EOFError as error:
+            self.kill()
+            raise ScraperCrashedError("Scraper worker exited") from error
+
+        if ok:
+            return value
+        raise value
+
+    def kill(self):
+        if self.process is None:
+            return
+
+        if self.process.is_alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError, PermissionError):
+                self.process.kill()
+
+        self.process.join()
+        self._conn.close()
+        self.process = None
+        self._conn = None
+
+    def stop(self, timeout: float):
+        """
+        Asks the worker to exit, killing it if it does not do so in time.
+        """
+        if self.process is None:
+            return
+
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+
+        self.process.join(timeout)
+        self.kill()
+
+
+class ScraperPool:
+    """
+    Runs scrapes in dedicated worker processes fed by a bounded priority queue.
+
+    A hung browser can only stall its own worker: the worker is killed when a
+    job exceeds its timeout and replaced on the next job. When the queue is
+    full a new job displaces the least urgent queued job, or is rejected with
+    ScraperBusyError if none is less urgent.
+    """
+
+    def __init__(
+        self,
+        nr_workers: int = 1,
+        max_queue: int = 8,
+        timeout: float = 60,
+        on_exit: Optional[Callable[[], Any]] = None,
+    ):
+        self.nr_workers = nr_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        context = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(context, on_exit) for _ in range(nr_workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._queue: List[_Job] = []
+        self._seq = itertools.count()
+        self._not_empty = asyncio.Condition()
+        self._closed = False
+
+    def start(self):
+        for worker in self._workers:
+            self._tasks.append(asyncio.create_task(self._serve(worker)))
+
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def submit(
+        self,
+        func: Callable,
+        *args,
+        priority: int = PRIORITY_CHECK,
+        timeout: float = None,
+    ) -> Any:
+        """
+        Runs `func(*args)` in a worker process and returns its result.
+
+        Parameters:
+        - func (Callable): A module-level function, it is pickled by reference.
+        - *args: Picklable arguments for `func`.
+        - priority (int, optional): PRIORITY_URL or PRIORITY_CHECK.
+        - timeout (float, optional): Seconds the job may run before its worker is
+          killed. Defaults to the pool's timeout.
+
+        Raises:
+        - ScraperBusyError: If the queue is full of jobs at least as urgent, or
+          the job is displaced by a more urgent one.
+        - asyncio.TimeoutError: If the job runs for longer than `timeout`.
+        - ScraperCrashedError: If the worker exits while running the job.
+        """
+        if self._closed:
+            raise ScraperBusyError("Scraper pool is closed")
+
+        job = _Job(
+            priority,
+            next(self._seq),
+            func,
+            args,
+            timeout or self.timeout,
+            asyncio.get_running_loop().create_future(),
+        )
+
+        if len(self._queue) >= self.max_queue:
+            least_urgent = max(self._queue)
+
+            if least_urgent.priority <= priority:
+                raise ScraperBusyError("Too many scrapes queued")
+
+            self._queue.remove(least_urgent)
+            heapq.heapify(self._queue)
+            least_urgent.future.set_exception(
+                ScraperBusyError("Displaced by a more urgent scrape")
+            )
+
+        heapq.heappush(self._queue, job)
+
+        async with self._not_empty:
+            self._not_empty.notify()
+
+        return await job.future
+
+    async def _serve(self, worker: _Worker):
+        while True:
+            async with self._not_empty:
+                await self._not_empty.wait_for(lambda: self._queue)
+                job = heapq.heappop(self._queue)
+
+            # The caller stopped waiting while the job was queued
+            if job.future.done():
+                continue
+
+            try:
+                result = await asyncio.to_thread(
+                    worker.run, job.func, job.args, job.timeout
+                )
+            except Exception as error:
+                if not job.future.done():
+                    job.future.set_exception(error)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+
+    async def close(self, timeout: float = 10):
+        """
+        Fails queued jobs and stops the workers, letting them quit their browsers.
+        """
+        self._closed = True
+
+        for task in self._tasks:
+            task.cancel()
+
+        for job in self._queue:
+            if not job.future.done():
+                job.future.set_exception(ScraperBusyError("Scraper pool is closed"))
+        self._queue.clear()
+
+        await asyncio.gather(
+            *(asyncio.to_thread(worker.stop, timeout) for worker in self._workers)
+        )
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single call whose result
+    is shared by every caller
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `func` unless a call with the same key is already running, in which
+        case its result is awaited instead.
+
+        Parameters:
+        - key (Hashable): Identifies the work, e.g. the puzzle date.
+        - func (Callable[[], Awaitable[T]]): Starts the work.
+
+        Returns:
+        - T: The result of the shared call. Its exception is raised to every
+          caller if it fails.
+        """
+        result, _ = await self.do_with_leader(key, func)
+        return result
+
+    async def do_with_leader(
+        self, key: Hashable, func: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """
+        Like `do`, but also tells whether this caller started the call.
+
+        Returns:
+        - Tuple[T, bool]: The result of the shared call, and True if this caller
+          ran `func` rather than joining a call that was already running.
+        """
+        future = self._calls.get(key)
+        leader = future is None
+
+        if leader:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+        # A caller that is cancelled must not cancel the call for everybody else
+        return await asyncio.shield(future), leader
@@ -0,0 +1,653 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+from metrics import STORAGE_SECONDS
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+JOURNAL_EXTENSIONS = (".jsonl",)
+
+
+class InsufficientTokensError(Exception):
+    """
+    Raised when a change would leave a player with a negative token balance
+    """
+
+    def __init__(self, player_id: str):
+        super().__init__(f"Insufficient tokens for player {player_id}")
+        self.player_id = player_id
+
+
+def atomic_write(file_path: str, content: str):
+    """
+    Writes a file atomically by writing to a temporary file in the same directory,
+    syncing it to disk and renaming it over the target.
+
+    Parameters:
+    - file_path (str): The path of the file to write.
+    - content (str): The text to write.
+    """
+    directory = os.path.dirname(file_path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _make_parent_dir(file_path: str):
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def compute_balances(
+    balances: Dict[str, int], deltas: Dict[str, int]
+) -> Dict[str, int]:
+    """
+    Computes the new balances after applying a batch of token changes.
+
+    Parameters:
+    - balances (Dict[str, int]): The current balances.
+    - deltas (Dict[str, int]): Maps player ids to the number of tokens to add.
+
+    Returns:
+    - Dict[str, int]: The new balances of the players in `deltas`.
+
+    Raises:
+    - InsufficientTokensError: If a removal would leave a player with a negative
+      balance.
+    """
+    updated = {}
+
+    for player_id, nr_tokens in deltas.items():
+        current_tokens = updated.get(player_id, balances.get(player_id, 0))
+        new_tokens = current_tokens + nr_tokens
+
+        if nr_tokens < 0 and new_tokens < 0:
+            raise InsufficientTokensError(player_id)
+
+        updated[player_id] = new_tokens
+
+    return updated
+
+
+class TokenStorage(ABC):
+    """
+    Storage backend for the token ledger. Player ids are strings.
+    """
+
+    @abstractmethod
+    def get_tokens(self, player_id: str) -> int:
+        pass
+
+    @abstractmethod
+    def has_player(self, player_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def get_players(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def get_balances(self) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def set_tokens(self, player_id: str, nr_tokens: int, reason: str = ""):
+        pass
+
+    @abstractmethod
+    def apply_deltas(self, deltas: Dict[str, int], reason: str = ""):
+        """
+        Applies a batch of token changes atomically.
+
+        Raises:
+        - InsufficientTokensError: If a removal would leave a player with a negative
+          balance. No change is applied in that case.
+        """
+
+    @abstractmethod
+    def add_to_all(self, nr_tokens: int, reason: str = "") -> int:
+        """
+        Adds tokens to every player atomically and returns the number of players.
+        """
+
+    def compact(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class KeyValueStorage(ABC):
+    """
+    Storage backend for simple registries, e.g. completed crosswords.
+    Keys are strings and values must be JSON serializable.
+    """
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        pass
+
+    @abstractmethod
+    def has(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def keys(self) -> List[str]:
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class JsonStore:
+    """
+    Keeps a JSON document in memory and writes it back to disk in the background.
+
+    Changes are group-committed: the first change after a flush schedules a write
+    `flush_delay` seconds later, and every change made in the meantime is written
+    along with it.
+    """
+
+    def __init__(self, file_path: str, flush_delay: float = 1.0):
+        self.file_path = file_path
+        self.flush_delay = flush_delay
+        self.lock = threading.RLock()
+
+        self._io_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+
+        _make_parent_dir(file_path)
+
+        if os.path.exists(file_path):
+            with STORAGE_SECONDS.time(backend="json", operation="load"):
+                with open(file_path, "r") as file:
+                    self.data = json.load(file)
+        else:
+            self.data = {}
+            atomic_write(file_path, json.dumps(self.data))
+
+    def mark_dirty(self):
+        with self.lock:
+            self._dirty = True
+
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Writes any pending changes to disk immediately.
+        """
+        with self._io_lock:
+            with self.lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+                if not self._dirty:
+                    return
+
+                with STORAGE_SECONDS.time(backend="json", operation="serialize"):
+                    content = json.dumps(self.data, indent=4)
+                self._dirty = False
+
+            with STORAGE_SECONDS.time(backend="json", operation="write"):
+                atomic_write(self.file_path, content)
+
+
+class JsonTokenStorage(TokenStorage):
+    """
+    Token ledger kept in a single JSON document, written behind
+    """
+
+    def __init__(self, file_path: str, flush_delay: float = 1.0):
+        self._store = JsonStore(file_path, flush_delay)
+
+    def get_tokens(self, player_id: str) -> int:
+        return self._store.data.get(player_id, 0)
+
+    def has_player(self, player_id: str) -> bool:
+        return player_id in self._store.data
+
+    def get_players(self) -> List[str]:
+        with self._store.lock:
+            return list(self._store.data.keys())
+
+    def get_balances(self) -> Dict[str, int]:
+        with self._store.lock:
+            return dict(self._store.data)
+
+    def set_tokens(self, player_id: str, nr_tokens: int, reason: str = ""):
+        with self._store.lock:
+            self._store.data[player_id] = nr_tokens
+
+        self._store.mark_dirty()
+
+    def apply_deltas(self, deltas: Dict[str, int], reason: str = ""):
+        with self._store.lock:
+            updated = compute_balances(self._store.data, deltas)
+            self._store.data.update(updated)
+
+        self._store.mark_dirty()
+
+    def add_to_all(self, nr_tokens: int, reason: str = "") -> int:
+        with self._store.lock:
+            data = self._store.data
+            for player_id in data:
+                data[player_id] += nr_tokens
+            nr_players = len(data)
+
+        self._store.mark_dirty()
+        return nr_players
+
+    def flush(self):
+        self._store.flush()
+
+
+class JsonKeyValueStorage(KeyValueStorage):
+    """
+    Registry kept in a single JSON document, written behind
+    """
+
+    def __init__(self, file_path: str, flush_delay: float = 1.0):
+        self._store = JsonStore(file_path, flush_delay)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._store.data.get(key, default)
+
+    def has(self, key: str) -> bool:
+        return key in self._store.data
+
+    def set(self, key: str, value: Any):
+        with self._store.lock:
+            self._store.data[key] = value
+
+        self._store.mark_dirty()
+
+    def keys(self) -> List[str]:
+        with self._store.lock:
+            return list(self._store.data.keys())
+
+    def flush(self):
+        self._store.flush()
+
+
+class JournalTokenStorage(TokenStorage):
+    """
+    Token ledger kept as an append-only journal of balance changes on top of a
+    periodically compacted snapshot.
+
+    Every batch is appended as one JSON line with a sequence number, a timestamp,
+    a reason and the per-player deltas, so a torn write loses the whole batch and
+    never part of it. When the journal grows past `compact_bytes` (or `compact()`
+    is called) the balances are written to the snapshot and the journal is
+    rotated to `<journal_path>.<seq>`, which keeps the full audit trail on disk.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        snapshot_path: str = None,
+        compact_bytes: int = 1024 * 1024,
+        fsync: bool = True,
+    ):
+        self.journal_path = journal_path
+        self.snapshot_path = (
+            snapshot_path or f"{os.path.splitext(journal_path)[0]}.snapshot.json"
+        )
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self.lock = threading.RLock()
+
+        self.balances = {}
+        self.seq = 0
+
+        _make_parent_dir(journal_path)
+        with STORAGE_SECONDS.time(backend="journal", operation="load"):
+            self._load()
+        self._journal = open(journal_path, "a")
+
+    def _load(self):
+        snapshot_seq = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as file:
+                snapshot = json.load(file)
+            self.balances = snapshot["tokens"]
+            snapshot_seq = snapshot["seq"]
+
+        self.seq = snapshot_seq
+
+        if not os.path.exists(self.journal_path):
+            return
+
+        valid_bytes = 0
+
+        with open(self.journal_path, "rb") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+
+                if not line.endswith(b"\n"):
+                    break
+
+                valid_bytes += len(line)
+
+                if entry["seq"] <= snapshot_seq:
+                    continue
+
+                for player_id, nr_tokens in entry["deltas"].items():
+                    self.balances[player_id] = (
+                        self.balances.get(player_id, 0) + nr_tokens
+                    )
+                self.seq = entry["seq"]
+
+        # Drop a torn write at the end so new entries start on a clean line
+        if valid_bytes < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(valid_bytes)
+
+    def _append(self, deltas: Dict[str, int], reason: str):
+        self.seq += 1
+        entry = {"seq": self.seq, "ts": time.time(), "reason": reason, "deltas": deltas}
+
+        with STORAGE_SECONDS.time(backend="journal", operation="append"):
+            self._journal.write(json.dumps(entry) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+
+    def _compact_if_large(self):
+        # Only once the batch is applied, or the snapshot would miss it
+        if self._journal.tell() >= self.compact_bytes:
+            self.compact()
+
+    def get_tokens(self, player_id: str) -> int:
+        return self.balances.get(player_id, 0)
+
+    def has_player(self, player_id: str) -> bool:
+        return player_id in self.balances
+
+    def get_players(self) -> List[str]:
+        with self.lock:
+            return list(self.balances.keys())
+
+    def get_balances(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.balances)
+
+    def set_tokens(self, player_id: str, nr_tokens: int, reason: str = ""):
+        with self.lock:
+            delta = nr_tokens - self.balances.get(player_id, 0)
+            self._append({player_id: delta}, reason)
+            self.balances[player_id] = nr_tokens
+            self._compact_if_large()
+
+    def apply_deltas(self, deltas: Dict[str, int], reason: str = ""):
+        with self.lock:
+            updated = compute_balances(self.balances, deltas)
+            self._append(deltas, reason)
+            self.balances.update(updated)
+            self._compact_if_large()
+
+    def add_to_all(self, nr_tokens: int, reason: str = "") -> int:
+        with self.lock:
+            deltas = {player_id: nr_tokens for player_id in self.balances}
+            if deltas:
+                self.apply_deltas(deltas, reason)
+            return len(deltas)
+
+    def compact(self):
+        """
+        Writes the current balances to the snapshot and starts a new journal.
+        """
+        with self.lock:
+            if self._journal.tell() == 0:
+                return
+
+            snapshot = {"seq": self.seq, "tokens": self.balances}
+            with STORAGE_SECONDS.time(backend="journal", operation="compact"):
+                atomic_write(self.snapshot_path, json.dumps(snapshot))
+
+            self._journal.close()
+            os.replace(self.journal_path, f"{self.journal_path}.{self.seq}")
+            self._journal = open(self.journal_path, "a")
+
+    def close(self):
+        with self.lock:
+            self._journal.close()
+
+
+class SqliteDatabase:
+    """
+    A shared SQLite connection in WAL mode, safe to use from several threads
+    """
+
+    def __init__(self, db_path: str):
+        _make_parent_dir(db_path)
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            db_path, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        with self.lock, STORAGE_SECONDS.time(backend="sqlite", operation="execute"):
+            return self.connection.execute(sql, parameters)
+
+    def transaction(self):
+        return _SqliteTransaction(self)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class _SqliteTransaction:
+    def __init__(self, database: SqliteDatabase):
+        self.database = database
+        self._start = None
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.database.lock.acquire()
+        self._start = time.perf_counter()
+        self.database.connection.execute("BEGIN IMMEDIATE")
+        return self.database.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.database.connection.execute("COMMIT")
+            else:
+                self.database.connection.execute("ROLLBACK")
+        finally:
+            STORAGE_SECONDS.observe(
+                time.perf_counter() - self._start,
+                backend="sqlite",
+                operation="transaction",
+            )
+            self.database.lock.release()
+
+
+class SqliteTokenStorage(TokenStorage):
+    """
+    Token ledger stored as one indexed row per player in SQLite
+    """
+
+    def __init__(self, database: SqliteDatabase, table: str = "tokens"):
+        self.database = database
+        self.table = table
+        self.database.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(player_id TEXT PRIMARY KEY, tokens INTEGER NOT NULL)"
+        )
+
+    def get_tokens(self, player_id: str) -> int:
+        row = self.database.execute(
+            f"SELECT tokens FROM {self.table} WHERE player_id = ?", (player_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def has_player(self, player_id: str) -> bool:
+        row = self.database.execute(
+            f"SELECT 1 FROM {self.table} WHERE player_id = ?", (player_id,)
+        ).fetchone()
+        return row is not None
+
+    def get_players(self) -> List[str]:
+        rows = self.database.execute(f"SELECT player_id FROM {self.table}").fetchall()
+        return [row[0] for row in rows]
+
+    def get_balances(self) -> Dict[str, int]:
+        rows = self.database.execute(
+            f"SELECT player_id, tokens FROM {self.table}"
+        ).fetchall()
+        return dict(rows)
+
+    def set_tokens(self, player_id: str, nr_tokens: int, reason: str = ""):
+        self.database.execute(
+            f"INSERT INTO {self.table} (player_id, tokens) VALUES (?, ?) "
+            "ON CONFLICT(player_id) DO UPDATE SET tokens = excluded.tokens",
+            (player_id, nr_tokens),
+        )
+
+    def apply_deltas(self, deltas: Dict[str, int], reason: str = ""):
+        with self.database.transaction() as connection:
+            for player_id, nr_tokens in deltas.items():
+                connection.execute(
+                    f"INSERT INTO {self.table} (player_id, tokens) VALUES (?, ?) "
+                    "ON CONFLICT(player_id) DO UPDATE "
+                    "SET tokens = tokens + excluded.tokens",
+                    (player_id, nr_tokens),
+                )
+
+                if nr_tokens < 0:
+                    (new_tokens,) = connection.execute(
+                        f"SELECT tokens FROM {self.table} WHERE player_id = ?",
+                        (player_id,),
+                    ).fetchone()
+
+                    if new_tokens < 0:
+                        raise InsufficientTokensError(player_id)
+
+    def add_to_all(self, nr_tokens: int, reason: str = "") -> int:
+        with self.database.transaction() as connection:
+            cursor = connection.execute(
+                f"UPDATE {self.table} SET tokens = tokens + ?", (nr_tokens,)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        self.database.close()
+
+
+class SqliteKeyValueStorage(KeyValueStorage):
+    """
+    Registry stored as one row per key in SQLite
+    """
+
+    def __init__(self, database: SqliteDatabase, table: str):
+        self.database = database
+        self.table = table
+        self.database.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self.database.execute(
+            f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def has(self, key: str) -> bool:
+        row = self.database.execute(
+            f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def set(self, key: str, value: Any):
+        self.database.execute(
+            f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def keys(self) -> List[str]:
+        rows = self.database.execute(f"SELECT key FROM {self.table}").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.database.close()
+
+
+def is_sqlite_path(path: str) -> bool:
+    return os.path.splitext(path)[1] in SQLITE_EXTENSIONS
+
+
+def open_token_storage(path: str) -> TokenStorage:
+    """
+    Opens the token ledger at `path`, picking the backend from the file extension.
+
+    Parameters:
+    - path (str): A JSON file, a journal ending in .jsonl, or an SQLite database
+      ending in .db/.sqlite/.sqlite3.
+
+    Returns:
+    - TokenStorage: The opened storage backend.
+    """
+    if is_sqlite_path(path):
+        return SqliteTokenStorage(SqliteDatabase(path))
+
+    if os.path.splitext(path)[1] in JOURNAL_EXTENSIONS:
+        return JournalTokenStorage(path)
+
+    return JsonTokenStorage(path)
+
+
+def open_key_value_storage(path: str, table: str) -> KeyValueStorage:
+    """
+    Opens the registry at `path`, picking the backend from the file extension.
+
+    Parameters:
+    - path (str): A JSON file, or an SQLite database ending in .db/.sqlite/.sqlite3.
+    - table (str): The table to use when `path` is an SQLite database.
+
+    Returns:
+    - KeyValueStorage: The opened storage backend.
+    """
+    if is_sqlite_path(path):
+        return SqliteKeyValueStorage(SqliteDatabase(path), table)
+
+    return JsonKeyValueStorage(path)
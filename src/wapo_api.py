@@ -1,163 +1,620 @@
+import os
+import asyncio
+import threading
 import time
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from urllib.parse import quote
+from typing import TYPE_CHECKING, Dict, Optional, Set
+from selenium.common.exceptions import (
+    ElementClickInterceptedException,
+    ElementNotInteractableException,
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+
+import helper
+from driver_pool import DriverPool, PooledDriver
+import watchdog
+from metrics import SCRAPE_STEP_SECONDS, WATCHDOG_KILLS
+from scraper_pool import PRIORITY_CHECK, PRIORITY_URL, ScraperPool
+
+# selenium.webdriver takes ~100 ms to import, so it is only imported by the
+# functions that drive a browser
+if TYPE_CHECKING:
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+
+
+# "lean" blocks everything the scrape does not need, "full" loads the whole page
+BROWSER_PROFILE = os.getenv("WAPO_BROWSER_PROFILE", "lean")
+
+# Every browser started here is recorded, so the watchdog can reap the ones
+# whose process died without quitting them
+BROWSER_PIDFILE = os.getenv("WAPO_BROWSER_PIDFILE", "data/browsers.jsonl")
+
+# Hosts the lean profile may connect to, including their subdomains
+ALLOWED_DOMAINS = (
+    "washingtonpost.com",
+    "amuselabs.com",
+    "cookielaw.org",
+    "onetrust.com",
+)
+
+DAILY_URL = "https://www.washingtonpost.com/crossword-puzzles/daily/"
+
+# A tiny same-site page to set the consent cookie on before the first scrape
+CONSENT_URL = "https://www.washingtonpost.com/robots.txt"
+
+
+def _get_blocking_pac(domains) -> str:
+    """
+    Builds a proxy auto-config script that sends every host outside `domains` to
+    a closed local port, so those requests fail immediately.
+    """
+    conditions = " || ".join(
+        f'host == "{domain}" || dnsDomainIs(host, ".{domain}")' for domain in domains
+    )
+    return (
+        "function FindProxyForURL(url, host) {"
+        f' if ({conditions}) return "DIRECT";'
+        ' return "PROXY 127.0.0.1:9"; }'
+    )
+
+
+def _apply_lean_profile(options: "Options"):
+    # Return from get() once the DOM is ready, the waits cover the rest
+    options.page_load_strategy = "eager"
+
+    options.set_preference("permissions.default.image", 2)
+    options.set_preference("media.autoplay.default", 5)
+    options.set_preference("gfx.downloadable_fonts.enabled", False)
+    options.set_preference("privacy.trackingprotection.enabled", True)
+
+    options.set_preference("network.proxy.type", 2)
+    options.set_preference(
+        "network.proxy.autoconfig_url",
+        "data:text/javascript," + quote(_get_blocking_pac(ALLOWED_DOMAINS)),
+    )
 
 
 def _get_driver():
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.firefox.service import Service
+
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
 
+    if BROWSER_PROFILE == "lean":
+        _apply_lean_profile(options)
+
     geckodriver_path = "/snap/bin/geckodriver"
     service = Service(executable_path=geckodriver_path)
 
-    return webdriver.Firefox(options=options, service=service)
+    with SCRAPE_STEP_SECONDS.time(step="driver_start"):
+        driver = webdriver.Firefox(options=options, service=service)
 
+    pids = [driver.service.process.pid]
+    if driver.capabilities.get("moz:processID"):
+        pids.append(driver.capabilities["moz:processID"])
 
-def get_wapo_url(day: str = None) -> str:
+    try:
+        watchdog.record_browsers(BROWSER_PIDFILE, pids)
+    except OSError as error:
+        print(f"Unable to record browser processes {pids}: {error}")
+
+    return driver
+
+
+_pool = DriverPool(
+    _get_driver,
+    size=int(os.getenv("WAPO_DRIVER_POOL_SIZE", "2")),
+    max_uses=int(os.getenv("WAPO_DRIVER_MAX_USES", "25")),
+)
+
+
+# Scrapes run on their own threads so they never block the event loop
+_executor = ThreadPoolExecutor(max_workers=_pool.size, thread_name_prefix="wapo")
+_local = threading.local()
+
+SCRAPE_TIMEOUT = float(os.getenv("WAPO_SCRAPE_TIMEOUT", "60"))
+
+# Hard limits enforced by enforce_scrape_limits, for scrapes that a timeout
+# alone does not stop, e.g. when quitting the browser hangs as well
+SCRAPE_KILL_GRACE = float(os.getenv("WAPO_SCRAPE_KILL_GRACE", "30"))
+SCRAPE_MAX_RSS_BYTES = int(os.getenv("WAPO_SCRAPE_MAX_RSS_MB", "1536")) * 2**20
+
+
+class ScrapeCancelledError(Exception):
+    """
+    Raised inside a scrape whose caller stopped waiting for it
+    """
+
+
+class _ScrapeJob:
+    """
+    Links a running scrape to the browser session it uses, so that the session
+    can be torn down when the caller times out or is cancelled
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._session = None
+        self._cancelled = False
+
+    def attach(self, session: PooledDriver):
+        with self._lock:
+            if self._cancelled:
+                raise ScrapeCancelledError()
+            self._session = session
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            session = self._session
+
+        if session is not None:
+            # Quitting the browser makes the blocked WebDriver call fail fast
+            session.discard = True
+            try:
+                session.driver.quit()
+            except Exception as error:
+                print(f"Unable to quit cancelled browser session: {error}")
+
+    def browser_pids(self, processes=None) -> Set[int]:
+        """
+        Returns the pids of geckodriver and the Firefox processes it started.
+        """
+        with self._lock:
+            session = self._session
+
+        try:
+            pid = session.driver.service.process.pid
+        except AttributeError:
+            return set()
+
+        return {pid} | watchdog.get_descendants(pid, processes)
+
+
+# Scrapes running on the executor, including ones whose caller gave up on them
+_jobs: Set[_ScrapeJob] = set()
+_jobs_lock = threading.Lock()
+
+
+@contextmanager
+def _session():
+    with _pool.session() as session:
+        job = getattr(_local, "job", None)
+        if job is not None:
+            job.attach(session)
+
+        yield session
+
+
+# Set by start_scraper_workers to move browsers out of the bot's process
+_scraper_pool: ScraperPool = None
+
+
+def start_scraper_workers(nr_workers: int = 1, max_queue: int = 8):
     """
-    Retrieves the URL of the latest Washington Post crossword puzzle.
+    Runs all further browser scrapes in `nr_workers` separate processes. Must be
+    called from the event loop.
 
     Parameters:
-    - day (str, optional): The specific day for which the crossword URL is needed. Defaults to None, which fetches the latest crossword puzzle.
+    - nr_workers (int, optional): The number of worker processes, each with its
+      own pool of browser sessions.
+    - max_queue (int, optional): The number of scrapes that may wait for a worker
+      before new ones are rejected with ScraperBusyError.
+    """
+    global _scraper_pool
+
+    _scraper_pool = ScraperPool(
+        nr_workers, max_queue, timeout=SCRAPE_TIMEOUT, on_exit=close_pool
+    )
+    _scraper_pool.start()
+
+
+async def _run_async(
+    func, *args, timeout: float = None, priority: int = PRIORITY_CHECK
+):
+    if _scraper_pool is not None:
+        return await _scraper_pool.submit(
+            func, *args, priority=priority, timeout=timeout
+        )
+
+    job = _ScrapeJob(timeout or SCRAPE_TIMEOUT)
+
+    def run():
+        job.started = time.monotonic()
+        _local.job = job
+        with _jobs_lock:
+            _jobs.add(job)
+        try:
+            return func(*args)
+        finally:
+            _local.job = None
+            with _jobs_lock:
+                _jobs.discard(job)
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, run)
+
+    try:
+        return await asyncio.wait_for(future, timeout or SCRAPE_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        loop.run_in_executor(None, job.cancel)
+        raise
+
+
+def enforce_scrape_limits(
+    grace: float = SCRAPE_KILL_GRACE, max_rss_bytes: int = SCRAPE_MAX_RSS_BYTES
+) -> int:
+    """
+    Kills the browsers of in-process scrapes that are still running `grace`
+    seconds after their timeout, or whose browser processes together use more
+    than `max_rss_bytes` of memory. Scrapes in worker processes are already
+    killed with their worker when they time out.
 
     Returns:
-    - str: The URL of the specified day's crossword puzzle.
+    - int: The number of processes that were killed.
+    """
+    processes = watchdog.list_processes()
+    now = time.monotonic()
+    killed = 0
 
-    Raises:
-    - WebDriverException: If there are issues in controlling the browser through WebDriver.
-    - TimeoutException: If the expected elements do not appear within the given time.
+    with _jobs_lock:
+        jobs = list(_jobs)
+
+    for job in jobs:
+        pids = job.browser_pids(processes)
+
+        # Still waiting for a browser session, there is nothing to kill yet
+        if not pids:
+            continue
+
+        if now - job.started > job.timeout + grace:
+            reason = "timeout"
+        elif watchdog.get_rss_bytes(pids) > max_rss_bytes:
+            reason = "memory"
+        else:
+            continue
+
+        print(f"Killing browser of scrape over its {reason} limit: {sorted(pids)}")
+
+        # Kill first, a stuck browser can also hang the quit in cancel
+        nr_killed = watchdog.kill_processes(pids)
+        WATCHDOG_KILLS.inc(nr_killed, reason=reason)
+        killed += nr_killed
+        job.cancel()
+
+    return killed
+
+
+def close_pool():
     """
-    driver = _get_driver()
+    Stops accepting scrapes and quits all warm browser sessions.
+    """
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _pool.close()
 
-    try:
-        driver.get("https://www.washingtonpost.com/crossword-puzzles/daily/")
 
-        wait = WebDriverWait(driver, 5)
+def _wait_for(wait: "WebDriverWait", condition, step: str):
+    with SCRAPE_STEP_SECONDS.time(step=step):
+        return wait.until(condition)
+
 
-        btn_accept_cookies = wait.until(
-            EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
+def _click_when_ready(wait: "WebDriverWait", locator, step: str):
+    """
+    Clicks an element as soon as it accepts the click, retrying while it is
+    missing, hidden or covered, e.g. by an opening modal.
+    """
+    from selenium.webdriver.common.by import By
+
+    def click(driver):
+        try:
+            element = driver.find_element(*locator)
+            element.click()
+            return element
+        except ElementClickInterceptedException:
+            # A cookie banner that was not suppressed covers the page
+            for button in driver.find_elements(By.ID, "onetrust-accept-btn-handler"):
+                if button.is_displayed():
+                    button.click()
+            return False
+        except (
+            NoSuchElementException,
+            ElementNotInteractableException,
+            StaleElementReferenceException,
+        ):
+            return False
+
+    return _wait_for(wait, click, step)
+
+
+def _preset_consent(session: PooledDriver):
+    """
+    Stores the OneTrust consent cookie in a fresh session so the cookie banner
+    never opens.
+    """
+    driver = session.driver
+
+    with SCRAPE_STEP_SECONDS.time(step="consent_preset"):
+        driver.get(CONSENT_URL)
+        driver.add_cookie(
+            {
+                "name": "OptanonAlertBoxClosed",
+                "value": datetime.now(timezone.utc).isoformat(),
+                "domain": ".washingtonpost.com",
+                "path": "/",
+            }
         )
+
+    session.consented = True
+
+
+def _accept_cookies(session: PooledDriver, wait: "WebDriverWait"):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    # The consent cookie lives as long as the browser session
+    if session.consented:
+        return
+
+    btn_accept_cookies = _wait_for(
+        wait,
+        EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")),
+        "wait_cookie_button",
+    )
+    with SCRAPE_STEP_SECONDS.time(step="cookie_click"):
         btn_accept_cookies.click()
+    session.consented = True
+
+
+def _open_crossword(session: PooledDriver, url: str) -> "WebDriverWait":
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    driver = session.driver
+
+    if BROWSER_PROFILE == "lean" and not session.consented:
+        _preset_consent(session)
+
+    with SCRAPE_STEP_SECONDS.time(step="page_load"):
+        driver.get(url)
+
+    wait = WebDriverWait(driver, 5)
 
+    _accept_cookies(session, wait)
+
+    with SCRAPE_STEP_SECONDS.time(step="iframe_switch"):
         crossword_frame = wait.until(
             EC.element_to_be_clickable((By.ID, "iframe-xword"))
         )
         driver.switch_to.frame(crossword_frame)
 
-        item_latest_crossword = wait.until(
-            EC.element_to_be_clickable((By.CLASS_NAME, "puzzle-link"))
-        )
-        item_latest_crossword.click()
+    return wait
 
-        btn_footer = wait.until(EC.element_to_be_clickable((By.ID, "footer-btn")))
-        btn_footer.click()
 
-        # Wait for things to load
-        time.sleep(2)
+def _generate_invite_link(session: PooledDriver, index: int) -> str:
+    """
+    Opens the `index`-th puzzle of the archive, newest first, and creates an
+    invite link for it.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    wait = _open_crossword(session, DAILY_URL)
+
+    _click_when_ready(
+        wait,
+        (
+            By.XPATH,
+            "(//*[contains(concat(' ', normalize-space(@class), ' '),"
+            f" ' puzzle-link ')])[{index + 1}]",
+        ),
+        "wait_puzzle_link",
+    )
+
+    btn_footer = _wait_for(
+        wait, EC.element_to_be_clickable((By.ID, "footer-btn")), "wait_footer"
+    )
+    btn_footer.click()
+
+    # The invite button is clickable only once the play view has loaded
+    _click_when_ready(
+        wait, (By.CLASS_NAME, "nav-social-play-invite-icon"), "wait_invite_button"
+    )
+
+    textarea_invite_link = _wait_for(
+        wait,
+        EC.presence_of_element_located((By.ID, "social-link")),
+        "wait_invite_link",
+    )
+    return textarea_invite_link.get_attribute("value")
 
-        btn_invite = wait.until(
-            EC.element_to_be_clickable((By.CLASS_NAME, "nav-social-play-invite-icon"))
-        )
-        btn_invite.click()
 
-        textarea_invite_link = wait.until(
-            EC.presence_of_element_located((By.ID, "social-link"))
-        )
-        return textarea_invite_link.get_attribute("value")
+def get_wapo_url(day: str = None) -> str:
+    """
+    Retrieves the URL of a Washington Post crossword puzzle.
+
+    Parameters:
+    - day (str, optional): The date of the puzzle in the format "DD-MM-YYYY". Defaults to None, which fetches the latest crossword puzzle.
+
+    Returns:
+    - str: The URL of the specified day's crossword puzzle.
+
+    Raises:
+    - ValueError: If the archive has no puzzle for `day`.
+    - WebDriverException: If there are issues in controlling the browser through WebDriver.
+    - TimeoutException: If the expected elements do not appear within the given time.
+    """
+    index = 0
+
+    if day is not None:
+        latest = datetime.strptime(helper.get_current_puzzle_date(), "%d-%m-%Y")
+        index = (latest - datetime.strptime(day, "%d-%m-%Y")).days
 
-    finally:
-        driver.quit()
+        if index < 0:
+            raise ValueError(f"The puzzle for {day} is not published yet")
 
+    with _session() as session:
+        url = _generate_invite_link(session, index)
 
-def is_complete(url: str) -> bool:
+    # The archive is one puzzle per day, unless today's is not out yet
+    if day is not None and helper.get_puzzle_date(url) != day:
+        raise ValueError(f"No puzzle for {day} in the archive")
+
+    return url
+
+
+def get_wapo_urls(nr_days: int = 7) -> Dict[str, str]:
     """
-    Checks if the crossword puzzle at the given URL is completed.
+    Creates invite links for the latest `nr_days` puzzles, walking the archive in
+    a single browser session.
 
     Parameters:
-    - url (str): The URL of the crossword puzzle to be checked.
+    - nr_days (int, optional): The number of puzzles to fetch, newest first.
 
     Returns:
-    - bool: True if the crossword puzzle is completed, False otherwise.
+    - Dict[str, str]: Invite links by puzzle date ("DD-MM-YYYY"). Puzzles whose
+      page did not load in time are left out.
 
     Raises:
     - WebDriverException: If there are issues in controlling the browser through WebDriver.
-    - TimeoutException: If the expected elements do not appear within the given time.
     """
-    driver = _get_driver()
+    urls = {}
 
-    try:
-        driver.get(url)
+    with _session() as session:
+        for index in range(nr_days):
+            try:
+                url = _generate_invite_link(session, index)
+            except TimeoutException as error:
+                print(f"Unable to fetch puzzle {index} of the archive: {error}")
+                continue
 
-        wait = WebDriverWait(driver, 5)
+            urls[helper.get_puzzle_date(url)] = url
 
-        btn_accept_cookies = wait.until(
-            EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
-        )
-        btn_accept_cookies.click()
+    return urls
 
-        crossword_frame = wait.until(
-            EC.element_to_be_clickable((By.ID, "iframe-xword"))
-        )
-        driver.switch_to.frame(crossword_frame)
-
-        modal_title = wait.until(
-            EC.visibility_of_element_located((By.CLASS_NAME, "modal-title"))
-        )
-        return modal_title.text == "Congratulations!"
 
-    except Exception as error:
-        print(f"Unable to check puzzle complete: {error}")
-        return False
+@dataclass(frozen=True)
+class PuzzleInspection:
+    """
+    The state of a crossword puzzle as read from one page load
+    """
 
-    finally:
-        driver.quit()
+    puzzle_id: str
+    complete: bool
+    solve_seconds: Optional[int] = None
 
 
-def get_puzzle_time(url: str) -> int:
+def inspect_puzzle(url: str) -> PuzzleInspection:
     """
-    Retrieves the time taken to complete a crossword puzzle from a given URL.
+    Checks if the crossword puzzle at the given URL is completed and, if so, how
+    long it took, loading the page only once.
 
     Parameters:
-    - url (str): The URL of the crossword puzzle.
+    - url (str): The URL of the crossword puzzle to be checked.
 
     Returns:
-    - int: The completion time of the puzzle in seconds.
+    - PuzzleInspection: The puzzle id, whether it is complete and the solve time in
+      seconds (None unless complete).
 
     Raises:
     - WebDriverException: If there are issues in controlling the browser through WebDriver.
-    - TimeoutException: If the expected elements do not appear within the given time.
+    - TimeoutException: If the puzzle page does not load within the given time.
     """
-    driver = _get_driver()
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    puzzle_id = helper.get_puzzle_id(url)
+
+    with _session() as session:
+        wait = _open_crossword(session, url)
+
+        try:
+            modal_title = _wait_for(
+                wait,
+                EC.visibility_of_element_located((By.CLASS_NAME, "modal-title")),
+                "wait_modal_title",
+            )
+        except TimeoutException:
+            return PuzzleInspection(puzzle_id, False)
+
+        if modal_title.text != "Congratulations!":
+            return PuzzleInspection(puzzle_id, False)
+
+        time_str = _wait_for(
+            wait,
+            EC.visibility_of_element_located((By.ID, "clock_str")),
+            "wait_clock",
+        )  # returns "X minutes and Y seconds"
 
-    try:
-        driver.get(url)
+        return PuzzleInspection(
+            puzzle_id, True, helper.parse_puzzle_time(time_str.text)
+        )
 
-        wait = WebDriverWait(driver, 5)
 
-        btn_accept_cookies = wait.until(
-            EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
-        )
-        btn_accept_cookies.click()
+async def aget_wapo_url(day: str = None, timeout: float = None) -> str:
+    """
+    Runs `get_wapo_url` without blocking the event loop.
 
-        crossword_frame = wait.until(
-            EC.element_to_be_clickable((By.ID, "iframe-xword"))
-        )
-        driver.switch_to.frame(crossword_frame)
+    Raises:
+    - asyncio.TimeoutError: If the scrape takes longer than `timeout` seconds
+      (defaults to SCRAPE_TIMEOUT).
+    - ScraperBusyError: If scraper workers are running and too many scrapes
+      are queued.
+    """
+    return await _run_async(
+        get_wapo_url, day, timeout=timeout, priority=PRIORITY_URL
+    )
+
+
+async def aget_wapo_urls(nr_days: int = 7, timeout: float = None) -> Dict[str, str]:
+    """
+    Runs `get_wapo_urls` without blocking the event loop.
+
+    Raises:
+    - asyncio.TimeoutError: If the scrape takes longer than `timeout` seconds
+      (defaults to SCRAPE_TIMEOUT per day).
+    - ScraperBusyError: If scraper workers are running and too many scrapes
+      are queued.
+    """
+    return await _run_async(
+        get_wapo_urls,
+        nr_days,
+        timeout=timeout or SCRAPE_TIMEOUT * nr_days,
+        priority=PRIORITY_URL,
+    )
 
-        time_str = wait.until(
-            EC.visibility_of_element_located((By.ID, "clock_str"))
-        )  # returns "X minutes and Y seconds"
 
-        parts = time_str.text.split(" ")
-        numbers = [p for p in parts if p.isdigit()]
+async def ainspect_puzzle(url: str, timeout: float = None) -> PuzzleInspection:
+    """
+    Runs `inspect_puzzle` without blocking the event loop.
 
-        return int(numbers[0]) * 60 + int(numbers[1])
+    Raises:
+    - asyncio.TimeoutError: If the scrape takes longer than `timeout` seconds
+      (defaults to SCRAPE_TIMEOUT).
+    - ScraperBusyError: If scraper workers are running and too many scrapes
+      are queued.
+    """
+    return await _run_async(inspect_puzzle, url, timeout=timeout)
+
+
+async def aclose():
+    """
+    Closes the scraper workers and all browser sessions.
+    """
+    if _scraper_pool is not None:
+        await _scraper_pool.close()
 
-    finally:
-        driver.quit()
+    await asyncio.to_thread(close_pool)
@@ -0,0 +1,248 @@
+"""
+Finds and kills leaked browser processes by reading /proc, so it only works on
+Linux. On other systems every function reports no processes.
+
+Only browsers recorded with `record_browsers` are ever reaped, never other
+Firefox processes of the same user.
+"""
+
+import json
+import os
+import signal
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass(frozen=True)
+class ProcessInfo:
+    """
+    A process as read from /proc
+    """
+
+    pid: int
+    ppid: int
+    name: str
+    uid: int
+    # Clock ticks after boot, tells a reused pid apart from the original process
+    started: int
+
+
+def _read_process(pid: int) -> ProcessInfo:
+    with open(f"/proc/{pid}/stat") as file:
+        stat = file.read()
+
+    # The name is in parentheses and may itself contain spaces or parentheses
+    name = stat[stat.index("(") + 1 : stat.rindex(")")]
+    fields = stat[stat.rindex(")") + 2 :].split()
+
+    return ProcessInfo(
+        pid, int(fields[1]), name, os.stat(f"/proc/{pid}").st_uid, int(fields[19])
+    )
+
+
+def _read_started(pid: int) -> int:
+    try:
+        return _read_process(pid).started
+    except (FileNotFoundError, ProcessLookupError, ValueError):
+        return 0
+
+
+def _is_running(processes: Dict[int, ProcessInfo], pid: int, started: int) -> bool:
+    process = processes.get(pid)
+    return process is not None and process.started == started
+
+
+@contextmanager
+def _locked(file):
+    # Several bot and scraper processes share the file
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def list_processes() -> Dict[int, ProcessInfo]:
+    """
+    Returns every process visible in /proc, by pid.
+    """
+    processes = {}
+
+    try:
+        entries = os.listdir("/proc")
+    except FileNotFoundError:
+        return processes
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+
+        try:
+            processes[int(entry)] = _read_process(int(entry))
+        except (FileNotFoundError, ProcessLookupError, ValueError):
+            # The process exited while we were reading it
+            continue
+
+    return processes
+
+
+def get_descendants(pid: int, processes: Dict[int, ProcessInfo] = None) -> Set[int]:
+    """
+    Returns the pids of every process started by `pid`, directly or not.
+    """
+    processes = processes if processes is not None else list_processes()
+
+    children: Dict[int, List[int]] = {}
+    for process in processes.values():
+        children.setdefault(process.ppid, []).append(process.pid)
+
+    descendants = set()
+    stack = list(children.get(pid, []))
+
+    while stack:
+        child = stack.pop()
+        if child not in descendants:
+            descendants.add(child)
+            stack.extend(children.get(child, []))
+
+    return descendants
+
+
+def get_rss_bytes(pids: Iterable[int]) -> int:
+    """
+    Sums the resident memory of the given processes, skipping ones that exited.
+    """
+    total = 0
+
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as file:
+                total += int(file.read().split()[1]) * PAGE_SIZE
+        except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+            continue
+
+    return total
+
+
+def record_browsers(path: str, pids: Iterable[int], owner: int = None):
+    """
+    Remembers browser processes started by `owner`, so they can be reaped once
+    `owner` is gone. Every process appends to the same file.
+
+    Parameters:
+    - path (str): The file listing the recorded browsers.
+    - pids (Iterable[int]): The geckodriver and Firefox processes.
+    - owner (int, optional): The process that started them, this one by default.
+    """
+    owner = owner if owner is not None else os.getpid()
+    owner_started = _read_started(owner)
+
+    lines = [
+        json.dumps(
+            {
+                "pid": pid,
+                "started": _read_started(pid),
+                "owner": owner,
+                "owner_started": owner_started,
+            }
+        )
+        + "\n"
+        for pid in pids
+    ]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as file, _locked(file):
+        file.writelines(lines)
+
+
+def find_orphans(
+    records: List[Dict[str, int]], processes: Dict[int, ProcessInfo] = None
+) -> Set[int]:
+    """
+    Finds recorded browsers that are still running although the process that
+    started them is not. Start times tell reused pids apart from the recorded
+    processes.
+
+    Returns:
+    - Set[int]: The orphaned browser processes and everything they started.
+    """
+    processes = processes if processes is not None else list_processes()
+    orphans = set()
+
+    for record in records:
+        if _is_running(processes, record["pid"], record["started"]) and not (
+            _is_running(processes, record["owner"], record["owner_started"])
+        ):
+            orphans.add(record["pid"])
+            orphans |= get_descendants(record["pid"], processes)
+
+    return orphans
+
+
+def kill_processes(pids: Iterable[int]) -> int:
+    """
+    Sends SIGKILL to the given processes.
+
+    Returns:
+    - int: The number of processes that were killed.
+    """
+    killed = 0
+
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except (ProcessLookupError, PermissionError):
+            continue
+
+    return killed
+
+
+def reap_orphans(path: str) -> int:
+    """
+    Kills recorded browsers left behind by crashed or killed processes, and
+    forgets the browsers that are no longer running.
+
+    Parameters:
+    - path (str): The file listing the recorded browsers.
+
+    Returns:
+    - int: The number of processes that were killed.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, "r+") as file, _locked(file):
+        records = []
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+        processes = list_processes()
+        killed = kill_processes(find_orphans(records, processes))
+
+        # Only browsers of running owners are left, the rest exited or were killed
+        live = [
+            record
+            for record in records
+            if _is_running(processes, record["pid"], record["started"])
+            and _is_running(processes, record["owner"], record["owner_started"])
+        ]
+
+        file.seek(0)
+        file.truncate()
+        file.writelines(json.dumps(record) + "\n" for record in live)
+
+    return killed
@@ -0,0 +1,16 @@
+class FakeDriver:
+    """
+    A WebDriver stand-in that only tracks whether it was quit
+    """
+
+    def __init__(self):
+        self.quit_called = False
+
+    @property
+    def current_url(self):
+        if self.quit_called:
+            raise RuntimeError("Session is gone")
+        return "about:blank"
+
+    def quit(self):
+        self.quit_called = True
@@ -0,0 +1,85 @@
+import asyncio
+from src.completion_watcher import CompletionWatcher
+
+
+def test_polls_back_off_until_done():
+    polls = []
+
+    async def poll(key):
+        polls.append(asyncio.get_running_loop().time())
+        return len(polls) == 4
+
+    async def run():
+        watcher = CompletionWatcher(poll, initial_delay=0.01, max_delay=1, backoff=2)
+        watcher.start()
+        watcher.watch("puzzle")
+        await asyncio.sleep(0.5)
+        watching = watcher.is_watching("puzzle")
+        await watcher.stop()
+        return watching
+
+    assert not asyncio.run(run())
+    assert len(polls) == 4
+
+    gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+    assert gaps[0] < gaps[1] < gaps[2]
+
+
+def test_delay_is_capped():
+    polls = []
+
+    async def poll(key):
+        polls.append(key)
+        return False
+
+    async def run():
+        watcher = CompletionWatcher(
+            poll, initial_delay=0.01, max_delay=0.02, backoff=10
+        )
+        watcher.start()
+        watcher.watch("puzzle")
+        await asyncio.sleep(0.2)
+        await watcher.stop()
+
+    asyncio.run(run())
+    assert len(polls) >= 5
+
+
+def test_failed_poll_keeps_watching():
+    polls = []
+
+    async def poll(key):
+        polls.append(key)
+        if len(polls) == 1:
+            raise RuntimeError("browser crashed")
+        return True
+
+    async def run():
+        watcher = CompletionWatcher(poll, initial_delay=0.01, max_delay=0.01)
+        watcher.start()
+        watcher.watch("puzzle")
+        await asyncio.sleep(0.1)
+        await watcher.stop()
+
+    asyncio.run(run())
+    assert polls == ["puzzle", "puzzle"]
+
+
+def test_unwatch_stops_polling():
+    polls = []
+
+    async def poll(key):
+        polls.append(key)
+        return False
+
+    async def run():
+        watcher = CompletionWatcher(poll, initial_delay=0.05)
+        watcher.start()
+        watcher.watch("a")
+        watcher.watch("b")
+        watcher.unwatch("a")
+        await asyncio.sleep(0.08)
+        await watcher.stop()
+
+    asyncio.run(run())
+    assert polls == ["b"]
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src.cogs import crossword
+from src.cogs.crossword import CrosswordCog
+from src.guilds import GuildStates
+
+TODAY = "19-12-2023"
+TODAY_URL = "https://www.washingtonpost.com/crossword?id=tca231219&set=wapo-daily"
+GUILD = SimpleNamespace(id=1, get_channel=lambda _: None)
+
+
+@pytest.fixture
+def cog(tmp_path, monkeypatch):
+    monkeypatch.setattr(crossword.helper, "get_current_puzzle_date", lambda: TODAY)
+
+    guild_states = GuildStates(
+        data_dir=str(tmp_path), tokens_path=str(tmp_path / "tokens.json")
+    )
+    yield CrosswordCog(SimpleNamespace(guild_states=guild_states))
+    guild_states.close()
+
+
+def test_archive_miss_is_not_fetched_again(cog, monkeypatch):
+    walks = []
+
+    async def get_wapo_urls(nr_days):
+        walks.append(nr_days)
+        return {}
+
+    monkeypatch.setattr(crossword.wapo_api, "aget_wapo_urls", get_wapo_urls)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await cog.get_puzzle_url(GUILD, "17-12-2023")
+
+    asyncio.run(run())
+    assert len(walks) == 1
+
+
+def test_archive_walk_does_not_block_todays_fetch(cog, monkeypatch):
+    async def run():
+        release = asyncio.Event()
+
+        async def get_wapo_urls(nr_days):
+            await release.wait()
+            return {}
+
+        async def get_wapo_url():
+            return TODAY_URL
+
+        monkeypatch.setattr(crossword.wapo_api, "aget_wapo_urls", get_wapo_urls)
+        monkeypatch.setattr(crossword.wapo_api, "aget_wapo_url", get_wapo_url)
+
+        archive = asyncio.create_task(cog.get_puzzle_url(GUILD, "17-12-2023"))
+        await asyncio.sleep(0)
+
+        url = await asyncio.wait_for(cog.get_puzzle_url(GUILD), 1)
+
+        release.set()
+        await asyncio.gather(archive, return_exceptions=True)
+        return url
+
+    assert asyncio.run(run()) == TODAY_URL
+
+
+def test_unpublished_puzzle_is_not_fetched_on_every_call(cog, monkeypatch):
+    yesterday_url = TODAY_URL.replace("tca231219", "tca231218")
+    scrapes = []
+
+    async def get_wapo_url():
+        scrapes.append(yesterday_url)
+        return yesterday_url
+
+    monkeypatch.setattr(crossword.wapo_api, "aget_wapo_url", get_wapo_url)
+
+    async def run():
+        return [await cog.get_puzzle_url(GUILD) for _ in range(3)]
+
+    assert asyncio.run(run()) == [yesterday_url] * 3
+    assert len(scrapes) == 1
+
+
+def test_poll_joining_a_reaction_check_does_not_announce(cog, monkeypatch):
+    sent = []
+
+    async def send(**kwargs):
+        sent.append(kwargs)
+
+    channel = SimpleNamespace(send=send)
+    cog.bot.get_guild = lambda guild_id: GUILD
+    cog.bot.get_channel = lambda channel_id: channel
+
+    state = cog.bot.guild_states.get(GUILD)
+    state.puzzle_manager.save_puzzle_url(TODAY, TODAY_URL)
+
+    async def check_puzzle(state, url):
+        await asyncio.sleep(0.01)
+        state.crossword_manager.save_crossword(TODAY)
+        return "complete"
+
+    monkeypatch.setattr(cog, "check_puzzle", check_puzzle)
+
+    async def run():
+        key = (GUILD.id, TODAY)
+        # The reaction starts the check and the poll joins it
+        reaction = cog._checks.do(key, lambda: cog.check_puzzle(state, TODAY_URL))
+        return await asyncio.gather(reaction, cog.poll_puzzle(key))
+
+    assert asyncio.run(run()) == ["complete", True]
+    assert sent == []
+
+
+def test_prefetch_scrapes_once_while_puzzle_is_unpublished(cog, monkeypatch):
+    yesterday_url = TODAY_URL.replace("tca231219", "tca231218")
+    scrapes = []
+
+    async def get_wapo_url():
+        scrapes.append(yesterday_url)
+        return yesterday_url
+
+    monkeypatch.setattr(crossword.wapo_api, "aget_wapo_url", get_wapo_url)
+    cog.bot.guilds = [GUILD]
+    cog.bot.guild_states.get(GUILD).config.set_channel_id(42)
+
+    async def run():
+        for _ in range(3):
+            await cog.prefetch_puzzle.coro(cog)
+
+    asyncio.run(run())
+    assert len(scrapes) == 1
@@ -0,0 +1,76 @@
+import threading
+import pytest
+from src.driver_pool import DriverPool, PoolTimeoutError
+from test.fakes import FakeDriver
+
+
+def test_session_is_reused():
+    pool = DriverPool(FakeDriver, size=1)
+
+    with pool.session() as first:
+        first.consented = True
+
+    with pool.session() as second:
+        assert second is first
+        assert second.consented
+
+
+def test_session_recycled_after_max_uses():
+    pool = DriverPool(FakeDriver, size=1, max_uses=2)
+
+    with pool.session() as first:
+        pass
+    with pool.session() as second:
+        pass
+    with pool.session() as third:
+        pass
+
+    assert first is second
+    assert third is not first
+    assert first.driver.quit_called
+
+
+def test_session_recycled_on_error():
+    pool = DriverPool(FakeDriver, size=1)
+
+    with pytest.raises(ValueError):
+        with pool.session() as first:
+            raise ValueError()
+
+    with pool.session() as second:
+        assert second is not first
+
+    assert first.driver.quit_called
+
+
+def test_unhealthy_session_replaced():
+    pool = DriverPool(FakeDriver, size=1)
+
+    with pool.session() as first:
+        pass
+    first.driver.quit()
+
+    with pool.session() as second:
+        assert second is not first
+
+
+def test_pool_is_bounded():
+    pool = DriverPool(FakeDriver, size=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold_session():
+        with pool.session():
+            checked_out.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_session)
+    thread.start()
+    checked_out.wait()
+
+    with pytest.raises(PoolTimeoutError):
+        with pool.session(timeout=0.01):
+            pass
+
+    release.set()
+    thread.join()
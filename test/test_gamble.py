@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+from src.cogs import gamble
+from src.cogs.gamble import Bet, GambleCog, RaceLobby, get_gamble_result, settle_bets
+from src.guilds import GuildStates
+
+
+def test_get_gamble_result():
+    standings = [2, 0, 3, 1]
+    assert get_gamble_result(standings, 2, 10) == 20
+    assert get_gamble_result(standings, 0, 10) == 15
+    assert get_gamble_result(standings, 3, 10) == 5
+    assert get_gamble_result(standings, 1, 10) == 0
+
+
+def test_settle_bets():
+    standings = [2, 0, 3, 1]
+    bets = [
+        Bet(1, "alice", 2, 10),
+        Bet(2, "bob", 1, 5),
+        Bet(1, "alice", 0, 2),
+    ]
+    assert settle_bets(bets, standings) == {1: 23, 2: 0}
+
+
+GUILD = SimpleNamespace(id=1, get_channel=lambda _: None)
+
+
+@pytest.fixture
+def guild_states(tmp_path):
+    guild_states = GuildStates(
+        data_dir=str(tmp_path), tokens_path=str(tmp_path / "tokens.json")
+    )
+    state = guild_states.get(GUILD)
+    state.token_manager.set_tokens(1, 10)
+    state.token_manager.set_tokens(2, 10)
+    yield guild_states
+    guild_states.close()
+
+
+class FakeChannel:
+    def __init__(self, channel_id=42):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+def test_cancelled_lobby_refunds_bets(guild_states):
+    state = guild_states.get(GUILD)
+
+    async def run():
+        cog = GambleCog(SimpleNamespace(guild_states=guild_states))
+        channel = FakeChannel()
+
+        # Bets are debited when they are placed
+        bets = [Bet(1, "alice", 0, 4), Bet(2, "bob", 1, 3), Bet(1, "alice", 2, 1)]
+        state.token_manager.update_tokens_many({1: -5, 2: -3}, "gamble bet")
+
+        lobby = RaceLobby(state, bets)
+        cog.lobbies[channel.id] = lobby
+        lobby.task = asyncio.create_task(cog.run_lobby(channel, lobby))
+        cog.lobby_tasks.add(lobby.task)
+        await asyncio.sleep(0)
+
+        # As on shutdown or reload, while the lobby still waits for bets
+        await cog.cog_unload()
+        return cog
+
+    cog = asyncio.run(run())
+
+    assert cog.lobbies == {}
+    assert state.token_manager.get_tokens(1) == 10
+    assert state.token_manager.get_tokens(2) == 10
+
+
+def test_unload_during_debit_refunds_bet(guild_states, monkeypatch):
+    state = guild_states.get(GUILD)
+    debiting = threading.Event()
+    release = threading.Event()
+    update_tokens = state.token_manager.update_tokens
+
+    def slow_update_tokens(*args):
+        debiting.set()
+        release.wait(5)
+        return update_tokens(*args)
+
+    monkeypatch.setattr(state.token_manager, "update_tokens", slow_update_tokens)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    ctx = SimpleNamespace(
+        author=SimpleNamespace(id=1, name="alice"),
+        guild=GUILD,
+        channel=FakeChannel(),
+        send=noop,
+        message=SimpleNamespace(add_reaction=noop),
+    )
+
+    async def run():
+        cog = GambleCog(SimpleNamespace(guild_states=guild_states))
+        bet = asyncio.create_task(cog.gamble.callback(cog, ctx, 1, 4))
+        await asyncio.to_thread(debiting.wait, 5)
+
+        # The cog is reloaded while the bet is being debited
+        unload = asyncio.create_task(cog.cog_unload())
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(bet, unload)
+
+        # Refunded by the unload itself, not by the loop shutting down later
+        return state.token_manager.get_tokens(1)
+
+    assert asyncio.run(run()) == 10
+
+
+def test_failed_payout_is_reported(guild_states, monkeypatch, capsys):
+    state = guild_states.get(GUILD)
+
+    async def handle_race_message(channel, renderer):
+        return [0, 1, 2, 3]
+
+    async def update_balances(state, deltas, reason):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(gamble, "RACE_LOBBY_SECONDS", 0)
+    monkeypatch.setattr(gamble, "handle_race_message", handle_race_message)
+
+    async def run():
+        cog = GambleCog(SimpleNamespace(guild_states=guild_states))
+        cog.update_balances = update_balances
+        lobby = RaceLobby(state, [Bet(1, "alice", 0, 4)])
+        await cog.run_lobby(channel, lobby)
+
+    channel = FakeChannel()
+    asyncio.run(run())
+
+    assert channel.sent == [{"content": "The horse race winnings could not be paid out"}]
+    assert "Unable to pay out horse race winnings {1: 8}" in capsys.readouterr().out
+
+
+def test_race_is_simulated_off_the_event_loop(monkeypatch):
+    threads = []
+    simulate_race = gamble.simulate_race
+
+    def recording_simulate_race(values, length):
+        threads.append(threading.current_thread())
+        return simulate_race(values, length)
+
+    monkeypatch.setattr(gamble, "simulate_race", recording_simulate_race)
+
+    class FakeRenderer:
+        async def play(self, message, embed, frames):
+            self.frames = frames
+
+    async def send(**kwargs):
+        return SimpleNamespace()
+
+    renderer = FakeRenderer()
+    standings = asyncio.run(
+        gamble.handle_race_message(SimpleNamespace(send=send), renderer)
+    )
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert sorted(standings) == [0, 1, 2, 3]
+    assert len(renderer.frames) == 4 * 20
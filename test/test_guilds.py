@@ -0,0 +1,91 @@
+import os
+from src.guilds import GuildStates
+
+LEGACY_CHANNEL_ID = 1184096292905943120
+
+
+class FakeGuild:
+    def __init__(self, guild_id, channel_ids=()):
+        self.id = guild_id
+        self.channel_ids = set(channel_ids)
+
+    def get_channel(self, channel_id):
+        return object() if channel_id in self.channel_ids else None
+
+
+def open_states(tmp_path, database_path=None):
+    return GuildStates(
+        data_dir=str(tmp_path),
+        tokens_path=str(tmp_path / "tokens.json"),
+        database_path=database_path,
+        legacy_channel_id=LEGACY_CHANNEL_ID,
+    )
+
+
+def test_legacy_guild_keeps_top_level_files(tmp_path):
+    guild_states = open_states(tmp_path)
+    state = guild_states.get(FakeGuild(1, [LEGACY_CHANNEL_ID]))
+
+    state.token_manager.set_tokens(123, 10)
+    guild_states.close()
+
+    assert os.path.exists(tmp_path / "tokens.json")
+    assert not os.path.exists(tmp_path / "guilds")
+
+
+def test_guild_ledgers_are_partitioned(tmp_path):
+    guild_states = open_states(tmp_path)
+    first = guild_states.get(FakeGuild(1))
+    second = guild_states.get(FakeGuild(2))
+
+    assert guild_states.get(FakeGuild(1)) is first
+
+    first.token_manager.set_tokens(123, 10)
+    second.crossword_manager.save_crossword("18-12-2023")
+
+    assert not second.token_manager.has_player(123)
+    assert not first.crossword_manager.has_crossword("18-12-2023")
+    guild_states.close()
+
+    assert os.path.exists(tmp_path / "guilds" / "1" / "tokens.json")
+    assert os.path.exists(tmp_path / "guilds" / "2" / "crosswords.json")
+
+
+def test_guild_config_persists(tmp_path):
+    database_path = str(tmp_path / "wapo.db")
+    guild_states = open_states(tmp_path, database_path)
+
+    legacy_config = guild_states.get(FakeGuild(1, [LEGACY_CHANNEL_ID])).config
+    config = guild_states.get(FakeGuild(2)).config
+
+    assert legacy_config.get_channel_id() == LEGACY_CHANNEL_ID
+    assert config.get_channel_id() is None
+    assert config.get_cooldown("wapo", 10) == 10
+
+    config.set_channel_id(42)
+    config.set_cooldown("wapo", 5)
+    config.set_day_reward("Monday", 3)
+    guild_states.close()
+
+    reloaded = open_states(tmp_path, database_path).get(FakeGuild(2)).config
+    assert reloaded.get_channel_id() == 42
+    assert reloaded.get_cooldown("wapo", 10) == 5
+    assert reloaded.get_day_rewards()["Monday"] == 3
+    assert reloaded.get_day_rewards()["Sunday"] == 10
+    assert os.path.exists(tmp_path / "guilds" / "2" / "wapo.db")
+
+
+def test_peek_does_not_create_state(tmp_path):
+    guild_states = open_states(tmp_path)
+
+    assert guild_states.peek(FakeGuild(1)) is None
+    assert not os.path.exists(tmp_path / "guilds")
+
+    guild_states.get(FakeGuild(1)).config.set_channel_id(42)
+    guild_states.close()
+
+    # Another process finds the state the first one created
+    reopened = open_states(tmp_path)
+    assert reopened.peek(FakeGuild(1)).config.get_channel_id() == 42
+    assert reopened.peek(FakeGuild(2, [LEGACY_CHANNEL_ID])) is not None
+    reopened.close()
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+import pytest
 from src import helper
 
 
@@ -11,6 +13,48 @@ def test_get_puzzle_date():
     assert url_date == "19-12-2023"
 
 
+def test_get_puzzle_id():
+    url = (
+        "https://www.washingtonpost.com/crossword-puzzles/daily/?"
+        "id=tca231219&set=wapo-daily&puzzleType=crossword"
+    )
+    assert helper.get_puzzle_id(url) == "tca231219"
+
+
+def test_parse_puzzle_time():
+    assert helper.parse_puzzle_time("4 minutes and 32 seconds") == 272
+    assert helper.parse_puzzle_time("12 minutes and 0 seconds") == 720
+
+
+def test_get_current_puzzle_date():
+    # Still the previous day in Washington
+    now = datetime(2023, 12, 19, 3, 0, tzinfo=timezone.utc)
+    assert helper.get_current_puzzle_date(now) == "18-12-2023"
+
+    now = datetime(2023, 12, 19, 6, 0, tzinfo=timezone.utc)
+    assert helper.get_current_puzzle_date(now) == "19-12-2023"
+
+
+def test_resolve_puzzle_date():
+    # Tuesday 19 December 2023 in Washington
+    now = datetime(2023, 12, 19, 15, 0, tzinfo=timezone.utc)
+
+    assert helper.resolve_puzzle_date("tuesday", now) == "19-12-2023"
+    assert helper.resolve_puzzle_date("Mon", now) == "18-12-2023"
+    assert helper.resolve_puzzle_date("wednesday", now) == "13-12-2023"
+    assert helper.resolve_puzzle_date("yesterday", now) == "18-12-2023"
+    assert helper.resolve_puzzle_date("2023-12-17", now) == "17-12-2023"
+    assert helper.resolve_puzzle_date("16-12-2023", now) == "16-12-2023"
+
+
+def test_resolve_puzzle_date_rejects_unavailable_days():
+    now = datetime(2023, 12, 19, 15, 0, tzinfo=timezone.utc)
+
+    for day in ("someday", "20-12-2023", "12-12-2023"):
+        with pytest.raises(ValueError):
+            helper.resolve_puzzle_date(day, now)
+
+
 def test_get_puzzle_weekday():
     date_str = "18-12-2023"
     weekday = helper.get_puzzle_weekday(date_str)
@@ -0,0 +1,58 @@
+import asyncio
+import aiohttp
+from src.metrics import Registry, start_http_server
+
+
+def test_counter_render():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors", ["command"])
+    errors.inc(command="gamble")
+    errors.inc(2, command="gamble")
+    errors.inc(command='say "hi"')
+
+    rendered = registry.render()
+    assert "# TYPE errors_total counter" in rendered
+    assert 'errors_total{command="gamble"} 3' in rendered
+    assert 'errors_total{command="say \\"hi\\""} 1' in rendered
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ["step"], buckets=[1, 5])
+    latency.observe(0.5, step="load")
+    latency.observe(2, step="load")
+    latency.observe(10, step="load")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{step="load",le="1.0"} 1' in lines
+    assert 'latency_seconds_bucket{step="load",le="5.0"} 2' in lines
+    assert 'latency_seconds_bucket{step="load",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{step="load"} 12.5' in lines
+    assert 'latency_seconds_count{step="load"} 3' in lines
+
+
+def test_histogram_time():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ["step"])
+
+    with latency.time(step="load"):
+        pass
+
+    assert latency.get_count(step="load") == 1
+
+
+def test_http_endpoint(unused_tcp_port):
+    registry = Registry()
+    registry.counter("requests_total", "Requests").inc()
+
+    async def run():
+        runner = await start_http_server(unused_tcp_port, registry=registry)
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = f"http://127.0.0.1:{unused_tcp_port}/metrics"
+                async with session.get(url) as response:
+                    return await response.text()
+        finally:
+            await runner.cleanup()
+
+    assert "requests_total 1" in asyncio.run(run())
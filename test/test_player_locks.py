@@ -0,0 +1,100 @@
+import asyncio
+import random
+from src.managers import TokenManager
+from src.player_locks import PlayerLocks
+
+
+def test_opposite_transfers_do_not_deadlock():
+    async def transfer(locks, from_player, to_player):
+        async with locks.hold(from_player, to_player):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        locks = PlayerLocks()
+        await asyncio.wait_for(
+            asyncio.gather(*(
+                transfer(locks, *pair) for pair in [(1, 2), (2, 1)] * 10
+            )),
+            timeout=5,
+        )
+
+    asyncio.run(run())
+
+
+def test_unrelated_players_run_in_parallel():
+    async def hold(locks, player_id, events):
+        async with locks.hold(player_id):
+            events.append(("start", player_id))
+            await asyncio.sleep(0.01)
+            events.append(("end", player_id))
+
+    async def run():
+        locks = PlayerLocks(nr_stripes=64)
+        player_a = 1
+        player_b = next(
+            p for p in range(2, 100) if locks._stripe(p) != locks._stripe(player_a)
+        )
+
+        events = []
+        await asyncio.gather(
+            hold(locks, player_a, events), hold(locks, player_b, events)
+        )
+        return events
+
+    events = asyncio.run(run())
+    assert [kind for kind, _ in events] == ["start", "start", "end", "end"]
+
+
+def test_hold_all_waits_for_every_player():
+    events = []
+
+    async def reward_all(locks):
+        async with locks.hold_all():
+            events.append("reward")
+
+    async def run():
+        locks = PlayerLocks()
+
+        async with locks.hold(7):
+            task = asyncio.create_task(reward_all(locks))
+            await asyncio.sleep(0.01)
+            events.append("send")
+
+        await asyncio.wait_for(task, timeout=1)
+
+    asyncio.run(run())
+    assert events == ["send", "reward"]
+
+
+def test_concurrent_transfers_keep_balances(tmp_path):
+    token_manager = TokenManager(str(tmp_path / "tokens.db"))
+    players = list(range(10))
+    for player_id in players:
+        token_manager.set_tokens(player_id, 10)
+
+    overdrafts = []
+
+    async def send(locks, from_player, to_player):
+        async with locks.hold(from_player, to_player):
+            if token_manager.get_tokens(from_player) < 3:
+                return
+            await asyncio.sleep(0)
+            balance = token_manager.get_tokens(from_player)
+            await asyncio.to_thread(token_manager.transfer, from_player, to_player, 3)
+            if balance < 3:
+                overdrafts.append(from_player)
+
+    async def run():
+        locks = PlayerLocks(nr_stripes=4)
+        rng = random.Random(0)
+        await asyncio.gather(*(
+            send(locks, *rng.sample(players, 2)) for _ in range(200)
+        ))
+
+    asyncio.run(run())
+
+    balances = [token_manager.get_tokens(player_id) for player_id in players]
+    assert sum(balances) == 100
+    assert min(balances) >= 0
+    assert not overdrafts
+    token_manager.close()
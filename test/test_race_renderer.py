@@ -0,0 +1,72 @@
+import asyncio
+from src.race_renderer import EditBudget, RaceRenderer
+
+
+class FakeChannel:
+    id = 1
+
+
+class FakeMessage:
+    channel = FakeChannel()
+
+    def __init__(self, edit_seconds: float = 0):
+        self.edit_seconds = edit_seconds
+        self.descriptions = []
+
+    async def edit(self, embed):
+        await asyncio.sleep(self.edit_seconds)
+        self.descriptions.append(embed.description)
+
+
+class FakeEmbed:
+    description = ""
+
+
+def test_budget_keeps_reserve():
+    budget = EditBudget(rate=0.001, burst=3)
+    assert budget.try_acquire(reserve=1)
+    assert budget.try_acquire(reserve=1)
+    assert not budget.try_acquire(reserve=1)
+    assert budget.try_acquire()
+
+
+def test_budget_backs_off_on_slow_edits():
+    budget = EditBudget(rate=1.0, min_rate=0.2, slow_edit=1.0)
+    budget.record_edit(2.0)
+    assert budget.rate == 0.5
+    budget.record_edit(5.0)
+    budget.record_edit(5.0)
+    budget.record_edit(5.0)
+    assert budget.rate == 0.2
+    budget.record_edit(0.1)
+    assert budget.rate > 0.2
+
+
+def test_race_result_is_always_rendered():
+    renderer = RaceRenderer(duration=0.2, min_frame_interval=0.01)
+    message = FakeMessage()
+    frames = [str(i) for i in range(80)]
+
+    asyncio.run(renderer.play(message, FakeEmbed(), frames))
+
+    assert message.descriptions[-1] == "79"
+    # Steps are grouped into frames within the channel's edit budget
+    assert len(message.descriptions) <= renderer.get_budget(1).burst
+    assert message.descriptions == sorted(message.descriptions, key=int)
+
+
+def test_concurrent_races_share_channel_budget():
+    renderer = RaceRenderer(duration=0.2, min_frame_interval=0.01)
+    messages = [FakeMessage(), FakeMessage()]
+    frames = [str(i) for i in range(80)]
+
+    async def run():
+        await asyncio.gather(
+            *(renderer.play(message, FakeEmbed(), frames) for message in messages)
+        )
+
+    asyncio.run(run())
+
+    assert all(message.descriptions[-1] == "79" for message in messages)
+    nr_edits = sum(len(message.descriptions) for message in messages)
+    assert nr_edits <= renderer.get_budget(1).burst + 1
@@ -0,0 +1,66 @@
+import random
+import numpy as np
+from src import race_sim
+
+
+def naive_standings(values, length):
+    values = list(values)
+    standings = []
+    below_threshold = set(range(len(values)))
+
+    while below_threshold:
+        index = random.choice(list(below_threshold))
+        values[index] += 1
+
+        if values[index] >= length:
+            below_threshold.remove(index)
+            standings.append(index)
+
+    return standings
+
+
+def trajectory_winner(trajectory, remaining):
+    moves = [0] * len(remaining)
+    for index in trajectory:
+        moves[index] += 1
+        if moves[index] == remaining[index]:
+            return index
+
+
+def test_simulate_standings_are_permutations():
+    standings = race_sim.simulate_standings(1000, nr_horses=4, length=20)
+    assert standings.shape == (1000, 4)
+    assert (np.sort(standings, axis=1) == np.arange(4)).all()
+
+
+def test_trajectory_moves_each_horse_to_goal():
+    trajectory = race_sim.simulate_trajectory([20, 5, 0, 12])
+    assert len(trajectory) == 37
+    assert np.bincount(trajectory, minlength=4).tolist() == [20, 5, 0, 12]
+
+
+def test_trajectory_matches_naive_simulation():
+    # Horse 1 has a head start, so it should win about as often as in a
+    # step-by-step simulation of the same race
+    rng = np.random.default_rng(1)
+    random.seed(1)
+    nr_races = 4000
+
+    fast_wins = sum(
+        trajectory_winner(race_sim.simulate_trajectory([4, 2, 4], rng), [4, 2, 4]) == 1
+        for _ in range(nr_races)
+    )
+    naive_wins = sum(naive_standings([0, 2, 0], 4)[0] == 1 for _ in range(nr_races))
+
+    assert abs(fast_wins - naive_wins) / nr_races < 0.05
+
+
+def test_expected_returns():
+    distribution = race_sim.get_position_distribution(
+        race_sim.simulate_standings(200_000)
+    )
+    assert np.allclose(distribution, 0.25, atol=0.01)
+
+    # floor(1.5) and floor(0.5) cost a one token bet a quarter of its value
+    assert np.allclose(race_sim.get_expected_returns(distribution, 1), 0.75, atol=0.02)
+    assert np.allclose(race_sim.get_expected_returns(distribution, 10), 1.0, atol=0.02)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+import pytest
+from src import scraper_pool
+from src.scraper_pool import PRIORITY_CHECK, PRIORITY_URL, ScraperPool
+
+
+def echo(value):
+    return value
+
+
+def get_pid():
+    return os.getpid()
+
+
+def fail():
+    raise ValueError("broken page")
+
+
+def hang(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_runs_jobs_in_worker_process():
+    async def run():
+        pool = ScraperPool(nr_workers=1)
+        pool.start()
+        try:
+            return await pool.submit(echo, "url"), await pool.submit(get_pid)
+        finally:
+            await pool.close()
+
+    result, pid = asyncio.run(run())
+    assert result == "url"
+    assert pid != os.getpid()
+
+
+def test_job_exception_is_raised_to_caller():
+    async def run():
+        pool = ScraperPool(nr_workers=1)
+        pool.start()
+        try:
+            await pool.submit(fail)
+        finally:
+            await pool.close()
+
+    with pytest.raises(ValueError, match="broken page"):
+        asyncio.run(run())
+
+
+def test_timeout_kills_and_replaces_worker():
+    async def run():
+        pool = ScraperPool(nr_workers=1)
+        pool.start()
+        try:
+            first_pid = await pool.submit(get_pid)
+
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.submit(hang, 30, timeout=0.5)
+
+            return first_pid, await pool.submit(get_pid)
+        finally:
+            await pool.close()
+
+    first_pid, second_pid = asyncio.run(run())
+    assert first_pid != second_pid
+
+
+def test_full_queue_sheds_least_urgent_job():
+    async def run():
+        pool = ScraperPool(nr_workers=1, max_queue=1)
+        pool.start()
+        try:
+            # Keep the only worker busy so the next jobs stay queued
+            running = asyncio.create_task(pool.submit(hang, 1))
+            await asyncio.sleep(0.1)
+
+            check = asyncio.create_task(pool.submit(echo, "check"))
+            await asyncio.sleep(0)
+
+            with pytest.raises(scraper_pool.ScraperBusyError):
+                await pool.submit(echo, "another check", priority=PRIORITY_CHECK)
+
+            url = await pool.submit(echo, "url", priority=PRIORITY_URL)
+
+            with pytest.raises(scraper_pool.ScraperBusyError):
+                await check
+
+            return await running, url
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == (1, "url")
+
+
+def test_urgent_jobs_run_first():
+    async def run():
+        pool = ScraperPool(nr_workers=1)
+        pool.start()
+        finished = []
+
+        async def submit(value, priority):
+            await pool.submit(echo, value, priority=priority)
+            finished.append(value)
+
+        try:
+            running = asyncio.create_task(pool.submit(hang, 0.5))
+            await asyncio.sleep(0.1)
+            await asyncio.gather(
+                submit("check", PRIORITY_CHECK), submit("url", PRIORITY_URL), running
+            )
+        finally:
+            await pool.close()
+
+        return finished
+
+    assert asyncio.run(run()) == ["url", "check"]
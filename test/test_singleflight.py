@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from src.singleflight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(
+            *(single_flight.do("key", work) for _ in range(5))
+        )
+        assert not single_flight.in_flight("key")
+        return results
+
+    assert asyncio.run(run()) == [1, 1, 1, 1, 1]
+    assert len(calls) == 1
+
+
+def test_different_keys_run_separately():
+    async def run():
+        single_flight = SingleFlight()
+        return await asyncio.gather(
+            single_flight.do("a", lambda: asyncio.sleep(0, "a")),
+            single_flight.do("b", lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_exception_is_shared():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError()
+
+    async def run():
+        single_flight = SingleFlight()
+        return await asyncio.gather(
+            single_flight.do("key", work),
+            single_flight.do("key", work),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_call():
+    async def run():
+        single_flight = SingleFlight()
+        first = asyncio.ensure_future(
+            single_flight.do("key", lambda: asyncio.sleep(0.02, "done"))
+        )
+        second = asyncio.ensure_future(
+            single_flight.do("key", lambda: asyncio.sleep(0.02, "other"))
+        )
+        await asyncio.sleep(0)
+        first.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_do_with_leader_tells_who_ran_the_call():
+    async def run():
+        single_flight = SingleFlight()
+        return await asyncio.gather(
+            single_flight.do_with_leader("key", lambda: asyncio.sleep(0.01, "x")),
+            single_flight.do_with_leader("key", lambda: asyncio.sleep(0.01, "y")),
+        )
+
+    assert asyncio.run(run()) == [("x", True), ("x", False)]
@@ -0,0 +1,136 @@
+import json
+import os
+import pytest
+from src.managers import CrosswordManager, MessageManager, TokenManager
+from src.migrate import migrate_json_to_sqlite
+from src.storage import JournalTokenStorage
+
+
+def test_crossword_manager_sqlite(tmp_path):
+    db_path = str(tmp_path / "wapo.db")
+    crossword_manager = CrosswordManager(db_path)
+    crossword_manager.save_crossword("18-12-2023")
+    crossword_manager.close()
+
+    reloaded = CrosswordManager(db_path)
+    assert reloaded.has_crossword("18-12-2023")
+    assert not reloaded.has_crossword("19-12-2023")
+    assert reloaded.get_crosswords() == ["18-12-2023"]
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    tokens_path = tmp_path / "tokens.json"
+    crosswords_path = tmp_path / "crosswords.json"
+    db_path = str(tmp_path / "wapo.db")
+
+    tokens_path.write_text(json.dumps({"1": 10, "2": 0}))
+    crosswords_path.write_text(json.dumps({"18-12-2023": True}))
+
+    assert migrate_json_to_sqlite(
+        str(tokens_path), str(crosswords_path), db_path
+    ) == (2, 1)
+
+    token_manager = TokenManager(db_path)
+    assert token_manager.get_tokens(1) == 10
+    assert token_manager.has_player(2)
+    assert CrosswordManager(db_path).has_crossword("18-12-2023")
+
+
+def test_journal_replays_after_restart(tmp_path):
+    journal_path = str(tmp_path / "tokens.jsonl")
+    token_manager = TokenManager(journal_path)
+    token_manager.set_tokens(1, 10)
+    token_manager.transfer(1, 2, 4, "send")
+    token_manager.close()
+
+    reloaded = TokenManager(journal_path)
+    assert reloaded.get_tokens(1) == 6
+    assert reloaded.get_tokens(2) == 4
+
+    with open(journal_path) as file:
+        entries = [json.loads(line) for line in file]
+    assert [entry["reason"] for entry in entries] == ["set", "send"]
+    assert entries[1]["deltas"] == {"1": -4, "2": 4}
+
+
+def test_journal_drops_torn_write(tmp_path):
+    journal_path = str(tmp_path / "tokens.jsonl")
+    token_manager = TokenManager(journal_path)
+    token_manager.set_tokens(1, 10)
+    token_manager.close()
+
+    with open(journal_path, "a") as file:
+        file.write('{"seq": 2, "ts": 0, "reason": "", "deltas": {"1": 5')
+
+    reloaded = TokenManager(journal_path)
+    assert reloaded.get_tokens(1) == 10
+
+    reloaded.update_tokens(1, 1)
+    reloaded.close()
+    assert TokenManager(journal_path).get_tokens(1) == 11
+
+
+def test_journal_compaction(tmp_path):
+    journal_path = str(tmp_path / "tokens.jsonl")
+    storage = JournalTokenStorage(journal_path, compact_bytes=200)
+    token_manager = TokenManager(storage)
+
+    for _ in range(10):
+        token_manager.update_tokens(1, 1)
+    token_manager.compact()
+    token_manager.update_tokens(1, 1)
+    token_manager.close()
+
+    assert os.path.exists(storage.snapshot_path)
+    assert os.path.getsize(journal_path) < 200
+    assert TokenManager(journal_path).get_tokens(1) == 11
+
+    segments = [f for f in os.listdir(tmp_path) if f.startswith("tokens.jsonl.")]
+    assert segments
+
+
+def test_journal_auto_compaction_keeps_every_batch(tmp_path):
+    journal_path = str(tmp_path / "tokens.jsonl")
+    storage = JournalTokenStorage(journal_path, compact_bytes=150)
+
+    for _ in range(5):
+        storage.apply_deltas({"1": 1})
+    storage.set_tokens("2", 3)
+    storage.close()
+
+    segments = [f for f in os.listdir(tmp_path) if f.startswith("tokens.jsonl.")]
+    assert segments
+
+    reloaded = JournalTokenStorage(journal_path, compact_bytes=150)
+    assert reloaded.get_balances() == {"1": 5, "2": 3}
+
+
+def test_journal_ignores_entries_in_snapshot(tmp_path):
+    journal_path = str(tmp_path / "tokens.jsonl")
+    storage = JournalTokenStorage(journal_path)
+    storage.apply_deltas({"1": 5})
+
+    # Simulate a crash after the snapshot was written but before rotation
+    with open(storage.snapshot_path, "w") as file:
+        json.dump({"seq": storage.seq, "tokens": storage.get_balances()}, file)
+    storage.close()
+
+    assert TokenManager(journal_path).get_tokens(1) == 5
+
+
+@pytest.mark.parametrize("file_name", ["messages.json", "messages.db"])
+def test_message_manager_survives_restart(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+
+    message_manager = MessageManager(path)
+    message_manager.save_puzzle_message(1186400000000000001, "https://x", "18-12-2023")
+    message_manager.close()
+
+    reloaded = MessageManager(path)
+    assert reloaded.is_puzzle_message(1186400000000000001)
+    assert not reloaded.is_puzzle_message(1186400000000000002)
+    assert reloaded.get_puzzle_message(1186400000000000001) == {
+        "url": "https://x",
+        "date": "18-12-2023",
+    }
+    assert reloaded.get_puzzle_message(1186400000000000002) is None
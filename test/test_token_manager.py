@@ -1,16 +1,20 @@
 import os
 import pytest
-from src.managers import TokenManager
+from src.managers import TokenManager, InsufficientTokensError
+from src.storage import JsonTokenStorage
 
 
-@pytest.fixture(scope="function")
-def token_manager():
-    token_json_path = "test/data/tokens.json"
-    token_manager = TokenManager(token_json_path)
+@pytest.fixture(scope="function", params=["tokens.json", "tokens.db"])
+def token_manager(request):
+    token_path = f"test/data/{request.param}"
+    token_manager = TokenManager(token_path)
 
     yield token_manager
 
-    os.remove(token_json_path)
+    token_manager.close()
+    for path in (token_path, f"{token_path}-wal", f"{token_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def test_set_tokens(token_manager):
@@ -24,3 +28,110 @@ def test_update_tokens(token_manager):
     token_manager.update_tokens(123, 10)
     tokens = token_manager.get_tokens(123)
     assert tokens == 20
+
+
+def test_has_player(token_manager):
+    assert not token_manager.has_player(123)
+    token_manager.set_tokens(123, 0)
+    assert token_manager.has_player(123)
+
+
+def test_flush_persists_tokens(tmp_path):
+    token_json_path = str(tmp_path / "tokens.json")
+    token_manager = TokenManager(token_json_path)
+    token_manager.update_tokens(123, 10)
+    token_manager.flush()
+
+    reloaded = TokenManager(token_json_path)
+    assert reloaded.get_tokens(123) == 10
+    assert os.listdir(tmp_path) == ["tokens.json"]
+
+
+def test_background_flush(tmp_path):
+    token_json_path = str(tmp_path / "tokens.json")
+    token_manager = TokenManager(JsonTokenStorage(token_json_path, flush_delay=0.01))
+    token_manager.set_tokens(123, 5)
+
+    token_manager.storage._store._timer.join()
+
+    assert TokenManager(token_json_path).get_tokens(123) == 5
+
+
+def test_update_tokens_many(token_manager):
+    token_manager.set_tokens(1, 5)
+    token_manager.update_tokens_many({1: 10, 2: 3})
+    assert token_manager.get_tokens(1) == 15
+    assert token_manager.get_tokens(2) == 3
+
+
+def test_update_tokens_many_is_all_or_nothing(token_manager):
+    token_manager.set_tokens(1, 5)
+    token_manager.set_tokens(2, 5)
+
+    with pytest.raises(InsufficientTokensError):
+        token_manager.update_tokens_many({1: 10, 2: -6})
+
+    assert token_manager.get_tokens(1) == 5
+    assert token_manager.get_tokens(2) == 5
+
+
+def test_reward_all(token_manager):
+    token_manager.set_tokens(1, 0)
+    token_manager.set_tokens(2, 4)
+
+    assert token_manager.reward_all(3) == 2
+    assert token_manager.get_tokens(1) == 3
+    assert token_manager.get_tokens(2) == 7
+
+
+def test_transfer(token_manager):
+    token_manager.set_tokens(1, 10)
+    token_manager.transfer(1, 2, 4)
+    assert token_manager.get_tokens(1) == 6
+    assert token_manager.get_tokens(2) == 4
+
+    with pytest.raises(InsufficientTokensError):
+        token_manager.transfer(1, 2, 7)
+
+    assert token_manager.get_tokens(1) == 6
+    assert token_manager.get_tokens(2) == 4
+
+
+def test_ranking_follows_updates(token_manager):
+    token_manager.set_tokens(1, 10)
+    token_manager.set_tokens(2, 30)
+    token_manager.set_tokens(3, 20)
+
+    assert token_manager.get_top(2) == [("2", 30), ("3", 20)]
+    assert token_manager.get_rank(1) == 3
+
+    token_manager.transfer(2, 1, 25)
+    assert token_manager.get_page(0) == [("1", 35), ("3", 20), ("2", 5)]
+
+    token_manager.reward_all(10)
+    assert token_manager.get_page(0) == [("1", 45), ("3", 30), ("2", 15)]
+    assert token_manager.get_page(1, page_size=2) == [("2", 15)]
+    assert token_manager.get_rank(4) is None
+
+
+def test_equal_balances_share_rank(token_manager):
+    token_manager.set_tokens(1, 10)
+    token_manager.set_tokens(2, 10)
+    token_manager.set_tokens(3, 5)
+
+    assert token_manager.get_rank(1) == 1
+    assert token_manager.get_rank(2) == 1
+    assert token_manager.get_rank(3) == 3
+
+
+def test_ranking_is_rebuilt_on_load(tmp_path):
+    path = str(tmp_path / "tokens.db")
+    token_manager = TokenManager(path)
+    token_manager.set_tokens(1, 10)
+    token_manager.update_tokens(2, 20)
+    token_manager.close()
+
+    reloaded = TokenManager(path)
+    assert reloaded.get_top(10) == [("2", 20), ("1", 10)]
+    assert reloaded.get_player_count() == 2
+    reloaded.close()
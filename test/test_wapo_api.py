@@ -0,0 +1,200 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+import pytest
+from selenium.common.exceptions import (
+    ElementClickInterceptedException,
+    NoSuchElementException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+from src import wapo_api
+from src.driver_pool import DriverPool
+from test.fakes import FakeDriver
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = DriverPool(FakeDriver, size=1)
+    monkeypatch.setattr(wapo_api, "_pool", pool)
+    return pool
+
+
+def test_run_async_returns_result(pool):
+    def scrape(value):
+        with wapo_api._session():
+            return value * 2
+
+    assert asyncio.run(wapo_api._run_async(scrape, 21)) == 42
+
+
+def test_run_async_timeout_quits_session(pool):
+    sessions = []
+    release = threading.Event()
+
+    def scrape():
+        with wapo_api._session() as session:
+            sessions.append(session)
+            release.wait(5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(wapo_api._run_async(scrape, timeout=0.05))
+
+    release.set()
+    assert sessions[0].driver.quit_called
+    assert sessions[0].discard
+
+
+def test_ainspect_puzzle_runs_inspection_off_the_loop(pool, monkeypatch):
+    inspection = wapo_api.PuzzleInspection("tca231219", True, 60)
+    threads = []
+
+    def inspect_puzzle(url):
+        threads.append(threading.current_thread())
+        return inspection
+
+    monkeypatch.setattr(wapo_api, "inspect_puzzle", inspect_puzzle)
+
+    assert asyncio.run(wapo_api.ainspect_puzzle("https://example.com")) == inspection
+    assert threads[0] is not threading.main_thread()
+
+
+class LoadingPage:
+    """
+    A page whose invite button appears, is covered by a cookie banner and only
+    then accepts the click
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.banner = FakeElement(self)
+
+    def find_element(self, by, value):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise NoSuchElementException()
+        return FakeElement(self, covered=self.banner.displayed)
+
+    def find_elements(self, by, value):
+        return [self.banner]
+
+
+class FakeElement:
+    def __init__(self, page, covered=False):
+        self.page = page
+        self.covered = covered
+        self.displayed = True
+        self.clicked = False
+
+    def is_displayed(self):
+        return self.displayed
+
+    def click(self):
+        if self.covered:
+            raise ElementClickInterceptedException()
+        if self is self.page.banner:
+            self.displayed = False
+        self.clicked = True
+
+
+def test_click_when_ready_retries_until_click_lands():
+    page = LoadingPage()
+    wait = WebDriverWait(page, 1, poll_frequency=0.01)
+
+    element = wapo_api._click_when_ready(wait, ("class name", "invite"), "test")
+
+    assert element.clicked
+    assert not page.banner.displayed
+    assert page.attempts == 3
+
+
+def test_blocking_pac_allows_only_listed_domains():
+    pac = wapo_api._get_blocking_pac(["washingtonpost.com"])
+
+    assert 'dnsDomainIs(host, ".washingtonpost.com")' in pac
+    assert 'return "PROXY 127.0.0.1:9"' in pac
+
+
+def invite_link(puzzle_date):
+    day, month, year = puzzle_date.split("-")
+    return (
+        "https://www.washingtonpost.com/crossword-puzzles/daily/?"
+        f"id=tca{year[2:]}{month}{day}&set=wapo-daily&puzzleType=crossword"
+    )
+
+
+@pytest.fixture
+def archive(monkeypatch, pool):
+    # Today is 19-12-2023, the archive lists one puzzle per day, newest first
+    dates = ["19-12-2023", "18-12-2023", "17-12-2023"]
+    opened = []
+
+    def generate_invite_link(session, index):
+        opened.append(session)
+        if index >= len(dates):
+            raise wapo_api.TimeoutException()
+        return invite_link(dates[index])
+
+    monkeypatch.setattr(wapo_api, "_generate_invite_link", generate_invite_link)
+    monkeypatch.setattr(
+        wapo_api.helper, "get_current_puzzle_date", lambda now=None: dates[0]
+    )
+    return opened
+
+
+def test_get_wapo_url_for_day(archive):
+    assert wapo_api.get_wapo_url("18-12-2023") == invite_link("18-12-2023")
+
+    with pytest.raises(ValueError):
+        wapo_api.get_wapo_url("20-12-2023")
+
+
+def test_get_wapo_urls_uses_one_session(archive):
+    urls = wapo_api.get_wapo_urls(4)
+
+    assert urls == {
+        puzzle_date: invite_link(puzzle_date)
+        for puzzle_date in ["19-12-2023", "18-12-2023", "17-12-2023"]
+    }
+    assert len(archive) == 4
+    assert len(set(archive)) == 1
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="needs /proc")
+def test_enforce_scrape_limits_kills_stuck_browser(monkeypatch):
+    browser = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+
+    class BrowserDriver(FakeDriver):
+        def __init__(self):
+            super().__init__()
+            self.service = SimpleNamespace(process=browser)
+
+    monkeypatch.setattr(wapo_api, "_pool", DriverPool(BrowserDriver, size=1))
+    attached = threading.Event()
+    release = threading.Event()
+
+    def scrape():
+        with wapo_api._session():
+            attached.set()
+            release.wait(5)
+
+    async def run():
+        task = asyncio.create_task(wapo_api._run_async(scrape, timeout=5))
+        await asyncio.to_thread(attached.wait, 5)
+
+        try:
+            # Within its limits nothing is killed
+            assert wapo_api.enforce_scrape_limits() == 0
+            return wapo_api.enforce_scrape_limits(max_rss_bytes=1)
+        finally:
+            release.set()
+            await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        assert asyncio.run(run()) == 1
+        assert browser.wait(5) != 0
+    finally:
+        browser.kill()
+        browser.wait()
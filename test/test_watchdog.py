@@ -0,0 +1,121 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from src import watchdog
+from src.watchdog import ProcessInfo
+
+linux_only = pytest.mark.skipif(
+    not os.path.isdir("/proc/self"), reason="needs /proc"
+)
+
+
+def table(*processes):
+    return {
+        process[0]: ProcessInfo(*process, uid=1000, started=process[0] * 100)
+        for process in processes
+    }
+
+
+def record(pid, owner, started=None):
+    return {
+        "pid": pid,
+        "started": started if started is not None else pid * 100,
+        "owner": owner,
+        "owner_started": owner * 100,
+    }
+
+
+def test_get_descendants_follows_the_whole_tree():
+    processes = table(
+        (1, 0, "init"),
+        (10, 1, "python"),
+        (11, 10, "geckodriver"),
+        (12, 11, "firefox"),
+        (13, 12, "Web Content"),
+        (20, 1, "bash"),
+    )
+
+    assert watchdog.get_descendants(10, processes) == {11, 12, 13}
+    assert watchdog.get_descendants(13, processes) == set()
+
+
+def test_find_orphans_only_reports_recorded_browsers_without_owner():
+    processes = table(
+        # The bot itself runs as pid 1, its browsers are still owned
+        (1, 0, "python"),
+        (2, 1, "geckodriver"),
+        (3, 2, "firefox"),
+        # geckodriver outlived the scraper worker that recorded it
+        (21, 1, "geckodriver"),
+        (22, 21, "firefox"),
+        (23, 22, "Web Content"),
+        # Firefox outlived both geckodriver and its owner
+        (31, 1, "firefox"),
+        # The user's own browser was never recorded
+        (40, 1, "firefox"),
+    )
+    records = [
+        record(2, owner=1),
+        record(3, owner=1),
+        record(21, owner=20),
+        record(22, owner=20),
+        record(30, owner=20),
+        record(31, owner=20),
+        # The pid was reused by an unrelated process
+        record(40, owner=20, started=1),
+    ]
+
+    assert watchdog.find_orphans(records, processes) == {21, 22, 23, 31}
+
+
+@linux_only
+def test_reads_and_kills_real_processes():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+
+    try:
+        processes = watchdog.list_processes()
+        assert processes[child.pid].ppid == os.getpid()
+        assert child.pid in watchdog.get_descendants(os.getpid(), processes)
+        assert watchdog.get_rss_bytes([child.pid]) > 0
+
+        assert watchdog.kill_processes([child.pid]) == 1
+        assert child.wait(5) != 0
+    finally:
+        child.kill()
+        child.wait()
+
+    # Exited processes are skipped rather than raising
+    assert watchdog.get_rss_bytes([child.pid]) == 0
+    assert watchdog.kill_processes([child.pid]) == 0
+
+
+@linux_only
+def test_reap_orphans_kills_browsers_of_exited_owner(tmp_path):
+    path = str(tmp_path / "browsers.jsonl")
+    sleep = [sys.executable, "-c", "import time; time.sleep(30)"]
+    owner = subprocess.Popen(sleep)
+    browser = subprocess.Popen(sleep)
+    mine = subprocess.Popen(sleep)
+
+    try:
+        watchdog.record_browsers(path, [browser.pid], owner=owner.pid)
+        watchdog.record_browsers(path, [mine.pid])
+
+        # Nothing is reaped while the owners are running
+        assert watchdog.reap_orphans(path) == 0
+
+        owner.kill()
+        owner.wait()
+
+        assert watchdog.reap_orphans(path) == 1
+        assert browser.wait(5) != 0
+        assert mine.poll() is None
+
+        with open(path) as file:
+            assert [json.loads(line)["pid"] for line in file] == [mine.pid]
+    finally:
+        for process in (owner, browser, mine):
+            process.kill()
+            process.wait()